@@ -8,6 +8,13 @@ import urllib.parse
 import json
 import unicodedata
 import re
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from backend.amiv_query import projection_params
+from backend.http_cache import default_cache
+from backend.keyword_matcher import KeywordMatcher
 
 # ---------------------------------------------------------------------------
 # Heuristic configuration for extracting refreshment information.
@@ -137,6 +144,101 @@ REFRESHMENT_RULES = {
 # matches are found.  The idea is to list the most substantial offering first.
 REFRESHMENT_DISPLAY_PRIORITY = ["food", "drinks", "snacks", "sweet", "coffee"]
 
+# Upper bound for the number of pages requested in parallel when the
+# concurrent pagination mode of ``fetch_all_events`` is used.
+DEFAULT_MAX_WORKERS = 8
+
+# Number of events handed to a worker process at once by ``classify_events``.
+DEFAULT_CHUNK_SIZE = 64
+
+# Text fields searched for refreshment keywords, in the order in which they
+# are combined by ``_build_refreshment_corpus``.
+REFRESHMENT_FIELDS = (
+    "title_en",
+    "catchphrase_en",
+    "description_en",
+    "title_de",
+    "catchphrase_de",
+    "description_de",
+)
+
+# Fields Eve adds to every returned document, whatever the projection.
+EVE_META_FIELDS = ("_id", "_updated", "_created", "_etag", "_links")
+
+
+class ProjectionError(Exception):
+    """Raised when an extractor reads a field that was not requested."""
+
+
+# Declare the event fields an extractor reads.
+def reads_fields(*fields):
+    """
+    Decorator recording the event ``fields`` an extractor reads.
+
+    The fields are stored as the ``fields`` attribute of the function so
+    that ``required_fields`` can derive the projection of an API request
+    from the extractors that will process the events.
+    """
+    def decorate(function):
+        function.fields = tuple(fields)
+        return function
+    return decorate
+
+
+def required_fields(extractors=None):
+    """
+    Return the event fields read by ``extractors`` (in declaration order).
+
+    ``extractors`` defaults to ``extract_event_fields``.  Eve meta fields are
+    always returned by the API and therefore left out.
+    """
+    extractors = (extract_event_fields,) if extractors is None else extractors
+    fields = {}
+    for extractor in extractors:
+        for field in extractor.fields:
+            if field not in EVE_META_FIELDS:
+                fields.setdefault(field)
+    return tuple(fields)
+
+
+class _ProjectedEvent(dict):
+    """Event that raises ``ProjectionError`` on access to other fields."""
+
+    def __init__(self, event, allowed):
+        super().__init__(event)
+        self._allowed = allowed
+
+    def _check(self, key):
+        if key not in self._allowed:
+            raise ProjectionError(f"field {key!r} is read but was not requested")
+
+    def __getitem__(self, key):
+        self._check(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self._check(key)
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self._check(key)
+        return super().get(key, default)
+
+
+def verify_projection(event, fields, extractors=None):
+    """
+    Run ``extractors`` on ``event`` and check they only read ``fields``.
+
+    Raises ``ProjectionError`` naming the first field an extractor reads that
+    is neither in ``fields`` nor an Eve meta field.  Extractors that only
+    read some fields conditionally are checked along the path ``event``
+    takes through them.
+    """
+    extractors = (extract_event_fields,) if extractors is None else extractors
+    allowed = frozenset(fields) | frozenset(EVE_META_FIELDS)
+    for extractor in extractors:
+        extractor(_ProjectedEvent(event, allowed))
+
 # Normalize text by removing diacritical marks (accents).
 def normalize_text(text):
     """Normalize text by removing diacritical marks (accents)."""
@@ -146,9 +248,16 @@ def normalize_text(text):
     )
 
 # Filter dictionary for the API query (on the server side).
-def build_api_url(base_url, filter_dict):
-    """Construct the full API URL with the 'where' query parameter."""
-    query_string = urllib.parse.urlencode({"where": json.dumps(filter_dict)})
+def build_api_url(base_url, filter_dict, params=None):
+    """Construct the full API URL with the 'where' query parameter and any extra query parameters."""
+    query = {}
+    if filter_dict:
+        query["where"] = json.dumps(filter_dict)
+    if params:
+        query.update(params)
+    if not query:
+        return base_url
+    query_string = urllib.parse.urlencode(query)
     return f"{base_url}?{query_string}"
 
 # Filter function to check if an event contains "apero" in any of its text fields (locally).
@@ -169,12 +278,79 @@ def event_contains_apero(event):
     return "apero" in combined_text
 
 # Fetch all events from the API, handling pagination.
-def fetch_all_events(base_url, filter_dict=None):
-    events = []
-    
+def fetch_all_events(base_url, filter_dict=None, concurrent=False, max_workers=DEFAULT_MAX_WORKERS, params=None):
+    """
+    Fetch every event matching ``filter_dict`` from the paginated API.
+
+    This collects the pages produced by ``iter_event_pages`` into one list;
+    see there for the meaning of ``concurrent``, ``max_workers`` and ``params``.
+    """
+    return [
+        event
+        for page in iter_event_pages(base_url, filter_dict, concurrent, max_workers, params)
+        for event in page
+    ]
+
+
+def iter_event_pages(base_url, filter_dict=None, concurrent=False, max_workers=DEFAULT_MAX_WORKERS, params=None):
+    """
+    Yield the events matching ``filter_dict`` page by page as lists.
+
+    By default the ``_links.next`` chain is followed one page at a time.  With
+    ``concurrent=True`` only the first page is requested on its own; the page
+    count is derived from its ``_meta`` block and the remaining pages are
+    fetched in parallel by at most ``max_workers`` threads.  In both modes the
+    pages are yielded in order as soon as they are available, and only a
+    bounded number of pages is held in memory at any time.
+
+    ``params`` are additional query parameters sent with every request, e.g.
+    a ``projection`` (see ``backend.amiv_query``).
+    """
     # Build the initial URL with filter if provided.
-    url = build_api_url(base_url, filter_dict) if filter_dict else base_url
-    
+    url = build_api_url(base_url, filter_dict, params)
+
+    if concurrent:
+        return _iter_pages_concurrently(base_url, filter_dict, url, max_workers, params)
+    return _iter_next_links(base_url, url)
+
+
+def iter_projected_event_pages(base_url, filter_dict=None, extractors=None, concurrent=False, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Like ``iter_event_pages`` but only request the fields ``extractors`` read.
+
+    The projection is derived with ``required_fields``.  The first event of
+    every page is passed through ``verify_projection`` so that an extractor
+    reading an undeclared field fails loudly instead of silently seeing
+    empty values.
+    """
+    fields = required_fields(extractors)
+    pages = iter_event_pages(base_url, filter_dict, concurrent, max_workers, projection_params(fields))
+    for page in pages:
+        if page:
+            verify_projection(page[0], fields, extractors)
+        yield page
+
+
+def _fetch_page(url):
+    """Request a single API page and return the decoded JSON payload."""
+    # Conditional request: unchanged pages are served from the on-disk cache.
+    response = default_cache.get(url, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def _next_page_url(data, base_url):
+    """Return the absolute URL of the page following ``data`` (or ``None``)."""
+    url = data.get('_links', {}).get('next', {}).get('href')
+    # If the API returns a relative URL, join it with the base URL.
+    if url and not url.startswith('http'):
+        # Remove any trailing slashes from base_url before joining.
+        url = requests.compat.urljoin(base_url.rstrip('/'), url)
+    return url
+
+
+def _iter_next_links(base_url, url):
+    """Walk the ``_links.next`` chain starting at ``url`` and yield each page's events."""
     while url:
         #print("Fetching:", url)  # Debug: print the URL of the current page.
         
@@ -182,32 +358,174 @@ def fetch_all_events(base_url, filter_dict=None):
         # with open("data/visited_urls.json", "w", encoding="utf-8") as outfile:
         #     json.dump(url, outfile, ensure_ascii=False, indent=2)
 
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = _fetch_page(url)
 
         # Assuming the API returns a JSON object with a '_items' key for the list of events.
         if isinstance(data, dict) and '_items' in data:
-            events.extend(data['_items'])
+            yield data['_items']
             # Use the 'next' link if available.
-            url = data.get('_links', {}).get('next', {}).get('href')
-            # If the API returns a relative URL, join it with the base URL.
-            if url and not url.startswith('http'):
-
-                # Remove any trailing slashes from base_url before joining.
-                url = requests.compat.urljoin(base_url.rstrip('/'), url)
+            url = _next_page_url(data, base_url)
 
         # If the API returns a list of events directly.
         # This is less common but some APIs might do this.        
         elif isinstance(data, list):
-            events.extend(data)
+            yield data
             # Break out if it's just a list
             url = None
         else:
             url = None
-    return events
+
+
+def _iter_pages_concurrently(base_url, filter_dict, first_url, max_workers, params=None):
+    """
+    Fetch the first page, then request all remaining pages in parallel.
+
+    The number of pages is computed from ``_meta.total`` and
+    ``_meta.max_results``.  If the first page carries no usable pagination
+    metadata we fall back to the serial ``_links.next`` walk.
+    """
+    data = _fetch_page(first_url)
+    if isinstance(data, list):
+        yield data
+        return
+    if not isinstance(data, dict) or '_items' not in data:
+        return
+
+    yield data['_items']
+    next_url = _next_page_url(data, base_url)
+    if not next_url:
+        return
+
+    meta = data.get('_meta', {})
+    total = meta.get('total')
+    per_page = meta.get('max_results')
+    if not isinstance(total, int) or not per_page:
+        yield from _iter_next_links(base_url, next_url)
+        return
+
+    first_page = meta.get('page', 1)
+    last_page = math.ceil(total / per_page)
+    page_urls = [
+        build_api_url(base_url, filter_dict, {**(params or {}), "page": page, "max_results": per_page})
+        for page in range(first_page + 1, last_page + 1)
+    ]
+    if not page_urls:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(page_urls)))) as executor:
+        for page in _ordered_map(executor, _fetch_page, page_urls, window=2 * max_workers):
+            if isinstance(page, dict):
+                yield page.get('_items', [])
+
+
+def _ordered_map(executor, function, iterable, window):
+    """
+    Like ``Executor.map`` but consumes ``iterable`` lazily.
+
+    At most ``window`` calls are in flight (or finished but not yet consumed)
+    at any time, and the results are yielded in input order.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Restrict a filter to events changed after the last synchronisation.
+def updated_since_filter(filter_dict, watermark):
+    """
+    Combine ``filter_dict`` with an ``_updated >= watermark`` condition.
+
+    ``watermark`` is an ``_updated`` value exactly as returned by the API
+    (e.g. ``"2024-05-01T12:00:00Z"``) so the server parses it with its own
+    date format.  Timestamps only have a resolution of one second, so events
+    updated in the same second as the watermark, but after it was taken,
+    are requested again; upserting them a second time is harmless.  Without
+    a watermark the filter is returned unchanged.
+    """
+    if not watermark:
+        return filter_dict
+    updated_clause = {"_updated": {"$gte": watermark}}
+    if not filter_dict:
+        return updated_clause
+    return {"$and": [filter_dict, updated_clause]}
+
+
+def latest_update(events, watermark=None):
+    """
+    Return the highest ``_updated`` timestamp among ``events`` and ``watermark``.
+
+    The API serialises timestamps in a fixed ISO 8601 format, so the strings
+    can be compared lexicographically.
+    """
+    for event in events:
+        updated = event.get("_updated")
+        if updated and (watermark is None or updated > watermark):
+            watermark = updated
+    return watermark
+
+
+def upsert_events(existing, updates, key="url"):
+    """
+    Merge ``updates`` into ``existing`` using ``key`` as identity.
+
+    Records already present are replaced in place so that the order of the
+    stored result set is preserved, new records are appended at the end.
+    """
+    merged = list(existing)
+    positions = {record.get(key): index for index, record in enumerate(merged)}
+    for record in updates:
+        index = positions.get(record.get(key))
+        if index is None:
+            positions[record.get(key)] = len(merged)
+            merged.append(record)
+        else:
+            merged[index] = record
+    return merged
+
+# Drop updates that would not change a result set.
+def changed_events(existing, updates, key="url"):
+    """
+    Return the records of ``updates`` that differ from the stored ones.
+
+    The incremental filter also returns the events updated in the same
+    second as the watermark, which were usually merged already; this drops
+    them (and any other record identical to its stored version).
+    """
+    stored = {record.get(key): record for record in existing}
+    return [record for record in updates if stored.get(record.get(key)) != record]
+
+# Replace the part of a result set that falls into a time_start window.
+def replace_window(existing, updates, start, end, key="url"):
+    """
+    Merge the complete result of a time-windowed sync into ``existing``.
+
+    ``updates`` must contain every event with ``start <= time_start < end``
+    (bounds formatted like the API's timestamps, e.g.
+    ``"2024-05-01T00:00:00Z"``).  Stored records in that window that are
+    missing from ``updates`` (deleted, or edited so that they no longer
+    match) are dropped; all other records are upserted as in
+    ``upsert_events``, so the order of the stored result set is preserved.
+    """
+    updates = list(updates)
+    current = {record.get(key) for record in updates}
+
+    def in_window(record):
+        if not record.get("date"):
+            return False
+        record_start = f"{record['date']}T{record.get('start_time') or '00:00'}:00Z"
+        return start <= record_start < end
+
+    kept = [
+        record for record in existing
+        if record.get(key) in current or not in_window(record)
+    ]
+    return upsert_events(kept, updates, key)
 
 # Extract specific fields from an event.
+@reads_fields("_links", "title_en", "title_de", "time_start", "time_end", "location", *REFRESHMENT_FIELDS)
 def extract_event_fields(event):
     """
     Extract specific fields from an event:
@@ -246,6 +564,54 @@ def extract_event_fields(event):
     }
 
 
+def classify_events(events, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Run ``extract_event_fields`` (including the refreshment inference) over
+    many events and return the results in input order.
+
+    With ``workers > 1`` the events are split into chunks of ``chunk_size``
+    which are processed by a pool of ``workers`` processes.  Small inputs
+    that fit into a single chunk are classified in the current process since
+    starting the pool would cost more than it saves.
+    """
+    events = list(events)
+    if workers <= 1 or len(events) <= chunk_size:
+        return _classify_chunk(events)
+
+    chunks = [events[i:i + chunk_size] for i in range(0, len(events), chunk_size)]
+    classified = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        # ``Executor.map`` yields the chunk results in submission order.
+        for chunk in executor.map(_classify_chunk, chunks):
+            classified.extend(chunk)
+    return classified
+
+
+def iter_classified_events(pages, workers=1):
+    """
+    Classify events page by page and yield the results as they are ready.
+
+    ``pages`` is an iterable of event lists such as the one returned by
+    ``iter_event_pages``.  With ``workers > 1`` the pages are classified in a
+    process pool; the input is consumed lazily and the output keeps the
+    input order.
+    """
+    if workers <= 1:
+        for page in pages:
+            yield from _classify_chunk(page)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for classified in _ordered_map(executor, _classify_chunk, pages, window=2 * workers):
+            yield from classified
+
+
+def _classify_chunk(events):
+    """Extract the fields of a list of events (executed in a worker process)."""
+    return [extract_event_fields(event) for event in events]
+
+
+@reads_fields(*REFRESHMENT_FIELDS)
 def infer_refreshments(event, rules=REFRESHMENT_RULES):
     """
     Analyse the textual fields of a raw AMIV event payload and estimate what
@@ -255,12 +621,14 @@ def infer_refreshments(event, rules=REFRESHMENT_RULES):
     ----------
     event : dict
         Raw event payload as returned by the AMIV API.
-    rules : dict, optional
+    rules : dict or CompiledRefreshmentRules, optional
         Mapping from category identifiers to dictionaries that contain a human
         readable ``label`` and a set of ``keywords`` (in lower-case) that signal
         the presence of the respective category.  The default is
         ``REFRESHMENT_RULES`` defined at module level so that tests can inject
-        alternative configurations where needed.
+        alternative configurations where needed.  Plain mappings are compiled
+        (and cached) via ``compile_refreshment_rules``; an already compiled
+        rule set is used as is.
 
     Returns
     -------
@@ -279,17 +647,9 @@ def infer_refreshments(event, rules=REFRESHMENT_RULES):
     if not corpus:
         return {"categories": [], "matches": {}, "summary": None}
 
-    matches = {}
-    for category, config in rules.items():
-        keywords = config.get("keywords", set())
-        # Normalise multi-word keywords so "finger food" is matched properly.
-        category_hits = sorted({
-            keyword
-            for keyword in keywords
-            if keyword and _keyword_in_text(keyword, corpus)
-        })
-        if category_hits:
-            matches[category] = category_hits
+    if not isinstance(rules, CompiledRefreshmentRules):
+        rules = compile_refreshment_rules(rules)
+    matches = rules.match(corpus)
 
     if not matches:
         return {"categories": [], "matches": {}, "summary": None}
@@ -298,7 +658,7 @@ def infer_refreshments(event, rules=REFRESHMENT_RULES):
         cat for cat in REFRESHMENT_DISPLAY_PRIORITY if cat in matches
     ] + [cat for cat in matches if cat not in REFRESHMENT_DISPLAY_PRIORITY]
 
-    summary = _format_refreshment_summary(categories, matches, rules)
+    summary = _format_refreshment_summary(categories, matches, rules.rules)
 
     return {
         "categories": categories,
@@ -315,14 +675,7 @@ def _build_refreshment_corpus(event):
     English and German, strips accents to make keyword matching more robust and
     collapses whitespace so that multi-word keywords remain searchable.
     """
-    fields = [
-        event.get("title_en", ""),
-        event.get("catchphrase_en", ""),
-        event.get("description_en", ""),
-        event.get("title_de", ""),
-        event.get("catchphrase_de", ""),
-        event.get("description_de", ""),
-    ]
+    fields = [event.get(field, "") for field in REFRESHMENT_FIELDS]
     combined = " ".join(filter(None, fields)).strip()
     if not combined:
         return ""
@@ -332,13 +685,78 @@ def _build_refreshment_corpus(event):
     return re.sub(r"\s+", " ", normalised)
 
 
-def _keyword_in_text(keyword, text):
+def _normalize_keyword(keyword):
+    """
+    Normalise ``keyword`` the same way as the corpus (lower-case, accents
+    stripped, whitespace collapsed) so that "finger food" is matched properly.
+    """
+    return re.sub(r"\s+", " ", normalize_text(keyword.lower()))
+
+
+class CompiledRefreshmentRules:
+    """
+    Refreshment rules prepared for repeated matching.
+
+    The keywords of every category are normalised once and indexed in a
+    single ``KeywordMatcher`` so that classifying an event only costs one
+    pass over its corpus.  The original mapping stays available as ``rules``
+    (e.g. for the category labels).
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Normalised keyword -> original spelling, per category.
+        self.keywords = {
+            category: {
+                _normalize_keyword(keyword): keyword
+                for keyword in config.get("keywords", set())
+                if keyword
+            }
+            for category, config in rules.items()
+        }
+        self.matcher = KeywordMatcher(
+            (normalised, (category, keyword))
+            for category, keywords in self.keywords.items()
+            for normalised, keyword in keywords.items()
+            if normalised
+        )
+
+    def match(self, corpus):
+        """
+        Return ``{category: sorted keywords}`` for all keywords found in the
+        normalised ``corpus``, with categories in the order of ``rules``.
+        """
+        hits = {}
+        for category, keyword in self.matcher.find(corpus):
+            hits.setdefault(category, set()).add(keyword)
+        return {
+            category: sorted(hits[category])
+            for category in self.keywords
+            if category in hits
+        }
+
+
+# Compiled rule sets keyed by ``id()`` of the mapping they were built from.
+# The mapping itself is kept alongside so the id cannot be reused while the
+# entry exists.  The oldest entry is evicted once the cache is full.
+_COMPILED_RULES_CACHE = {}
+_COMPILED_RULES_CACHE_SIZE = 32
+
+
+def compile_refreshment_rules(rules=REFRESHMENT_RULES):
     """
-    Determine whether ``keyword`` appears in ``text`` after normalisation.
-    Both inputs are assumed to be non-empty strings.
+    Return the ``CompiledRefreshmentRules`` for ``rules``, compiling it on the
+    first call only.  Rule sets are cached by identity, so a mapping must not
+    be modified after it has been used for matching.
     """
-    keyword_norm = re.sub(r"\s+", " ", normalize_text(keyword.lower()))
-    return keyword_norm in text if keyword_norm else False
+    cached = _COMPILED_RULES_CACHE.get(id(rules))
+    if cached is not None and cached[0] is rules:
+        return cached[1]
+    compiled = CompiledRefreshmentRules(rules)
+    if len(_COMPILED_RULES_CACHE) >= _COMPILED_RULES_CACHE_SIZE:
+        del _COMPILED_RULES_CACHE[next(iter(_COMPILED_RULES_CACHE))]
+    _COMPILED_RULES_CACHE[id(rules)] = (rules, compiled)
+    return compiled
 
 
 def _format_refreshment_summary(categories, matches, rules):
@@ -0,0 +1,124 @@
+"""Query builder for the AMIV API.
+
+The AMIV API is an Eve/MongoDB service: events are filtered with a MongoDB
+``where`` clause and the returned fields can be narrowed with a
+``projection``.  Every clause of the ``where`` filter is evaluated on the
+server for each page request, so the filter is kept as small as possible:
+all keywords searched in one field are combined into a single
+case-insensitive regular expression (one clause per field instead of one
+per field and keyword), and an optional ``time_start`` window lets the
+server skip past events entirely.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Iterable, Mapping, Optional, Union
+
+# Text fields of an event, per language suffix.
+AMIV_TEXT_FIELDS = ("title", "description", "catchphrase")
+
+# Keywords searched on the server, per language.  They are a coarse
+# pre-selection; ``infer_refreshments`` classifies the events locally.
+AMIV_KEYWORDS = {
+    "en": ("aper", "food"),
+    "de": ("aper", "essen"),
+}
+
+# Date format the AMIV API uses for timestamps in requests and responses.
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+Timestamp = Union[str, datetime]
+
+
+def keyword_regex(keywords: Iterable[str]) -> str:
+    """Return one regular expression that matches any of ``keywords``."""
+    return "|".join(re.escape(keyword) for keyword in dict.fromkeys(keywords))
+
+
+def format_timestamp(moment: Timestamp) -> str:
+    """Format ``moment`` in the API's ``DATE_FORMAT`` (strings are kept as is)."""
+    if isinstance(moment, str):
+        return moment
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime(DATE_FORMAT)
+
+
+def keyword_filter(
+    keywords: Mapping[str, Iterable[str]] = AMIV_KEYWORDS,
+    fields: Iterable[str] = AMIV_TEXT_FIELDS,
+) -> dict[str, Any]:
+    """Return a ``where`` clause matching events that mention a keyword.
+
+    Parameters
+    ----------
+    keywords : mapping, default ``AMIV_KEYWORDS``
+        Keywords per language suffix; ``{"en": ["aper"]}`` searches
+        ``title_en`` and the other ``fields`` with suffix ``_en``.
+    fields : iterable of str, default ``AMIV_TEXT_FIELDS``
+        Names of the text fields without language suffix.
+
+    The result has one case-insensitive ``$regex`` clause per field.
+    """
+    fields = tuple(fields)
+    clauses = []
+    for language, words in keywords.items():
+        pattern = keyword_regex(words)
+        if not pattern:
+            continue
+        for name in fields:
+            clauses.append({f"{name}_{language}": {"$regex": pattern, "$options": "i"}})
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$or": clauses}
+
+
+def time_window_filter(start: Optional[Timestamp] = None, end: Optional[Timestamp] = None) -> dict[str, Any]:
+    """Return a ``where`` clause for events with ``start <= time_start < end``.
+
+    Either bound may be omitted; without both an empty clause is returned.
+    """
+    condition = {}
+    if start is not None:
+        condition["$gte"] = format_timestamp(start)
+    if end is not None:
+        condition["$lt"] = format_timestamp(end)
+    return {"time_start": condition} if condition else {}
+
+
+def combine_filters(*filters: Optional[Mapping[str, Any]]) -> dict[str, Any]:
+    """Combine ``where`` clauses with ``$and``, dropping empty ones."""
+    clauses = [dict(clause) for clause in filters if clause]
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def build_where(
+    keywords: Mapping[str, Iterable[str]] = AMIV_KEYWORDS,
+    fields: Iterable[str] = AMIV_TEXT_FIELDS,
+    time_start: Optional[Timestamp] = None,
+    time_end: Optional[Timestamp] = None,
+) -> dict[str, Any]:
+    """Return the ``where`` filter for ``keywords`` within a ``time_start`` window.
+
+    See ``keyword_filter`` and ``time_window_filter``.
+    """
+    return combine_filters(keyword_filter(keywords, fields), time_window_filter(time_start, time_end))
+
+
+def projection_params(fields: Optional[Iterable[str]]) -> dict[str, str]:
+    """Return the query parameters that restrict the response to ``fields``.
+
+    Use ``amiv_api.required_fields`` to derive the fields from the
+    extractors.  Without ``fields`` no parameters are returned and the API
+    sends the full events.
+    """
+    if not fields:
+        return {}
+    return {"projection": json.dumps({name: 1 for name in dict.fromkeys(fields)})}
@@ -0,0 +1,124 @@
+"""Content-addressed storage for large crawl payloads.
+
+Blobs (HTML, extracted content, markdown) are stored once under the SHA-256
+digest of their content as gzip-compressed files.  Identical payloads, such
+as re-crawled unchanged pages or pages sharing a template, are therefore
+stored only once, also across crawl runs.  Records keep the digest and load
+the content lazily via :class:`LazyRecord`.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Iterator, Union
+
+# Default location of the blobs, next to the other crawl data.
+BLOB_DIR = Path(__file__).resolve().parent.parent / "data" / "blobs"
+
+# Suffix of the record keys that hold the digest of a blob field, e.g.
+# ``html_sha256`` for ``html``.
+DIGEST_SUFFIX = "_sha256"
+
+
+class BlobStore:
+    """Directory of gzip-compressed blobs addressed by their SHA-256 digest.
+
+    Parameters
+    ----------
+    root : Path, default ``BLOB_DIR``
+        Blobs are stored as ``<root>/<first two hex digits>/<digest>.gz``.
+    """
+
+    def __init__(self, root: Union[str, Path] = BLOB_DIR) -> None:
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.gz"
+
+    def __contains__(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def put(self, data: Union[str, bytes]) -> str:
+        """Store ``data`` (text is encoded as UTF-8) and return its digest.
+
+        Nothing is written if a blob with the same content already exists.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with gzip.open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Return the content of the blob ``digest``."""
+        with gzip.open(self._path(digest), "rb") as f:
+            return f.read()
+
+    def get_text(self, digest: str) -> str:
+        """Return the content of the blob ``digest`` decoded as UTF-8."""
+        return self.get(digest).decode("utf-8")
+
+
+def externalize(record: dict[str, Any], blobs: BlobStore, fields: tuple[str, ...]) -> dict[str, Any]:
+    """Move ``fields`` of ``record`` into ``blobs``.
+
+    Returns a copy of ``record`` in which every field is replaced by a
+    ``<field>_sha256`` key holding the digest (or ``None`` if the field was
+    empty).
+    """
+    stored = {key: value for key, value in record.items() if key not in fields}
+    for field in fields:
+        value = record.get(field)
+        stored[field + DIGEST_SUFFIX] = blobs.put(str(value)) if value else None
+    return stored
+
+
+class LazyRecord(Mapping):
+    """Read-only view of a stored record that loads blob fields on access.
+
+    Listing or filtering records only touches the small metadata; the
+    content of a blob field is read from disk the first time it is accessed
+    (e.g. ``record["html"]``) and cached afterwards.
+    """
+
+    def __init__(self, record: dict[str, Any], blobs: BlobStore) -> None:
+        self._record = record
+        self._blobs = blobs
+        self._loaded: dict[str, Any] = {}
+
+    def _digest_key(self, key: str) -> str:
+        return key + DIGEST_SUFFIX
+
+    def __getitem__(self, key: str) -> Any:
+        digest_key = self._digest_key(key)
+        if digest_key not in self._record:
+            return self._record[key]
+        if key not in self._loaded:
+            digest = self._record[digest_key]
+            self._loaded[key] = self._blobs.get_text(digest) if digest else None
+        return self._loaded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._record:
+            if key.endswith(DIGEST_SUFFIX):
+                yield key[: -len(DIGEST_SUFFIX)]
+            else:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._record)
+
+    def digest(self, key: str) -> Any:
+        """Return the digest of the blob field ``key`` without loading it."""
+        return self._record[self._digest_key(key)]
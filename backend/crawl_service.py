@@ -0,0 +1,220 @@
+"""Long-lived crawl4ai service with a pool of warm browsers.
+
+Starting a headless browser and rendering a page are by far the most
+expensive steps of a crawl4ai crawl.  :class:`CrawlerService` starts its
+browsers once and reuses them (and crawl4ai's browser contexts) for every
+URL it is given, across any number of seed URLs and sites.
+
+Most event pages are rendered on the server and do not need a browser at
+all.  Each URL is therefore first fetched with a plain HTTP request; the
+browser is only used if the response looks like a JavaScript application
+shell (see ``needs_browser``).  Hosts that needed the browser once are
+rendered in the browser right away afterwards.  Pages that cannot be fetched
+(network errors, error status codes) are returned as failed results.
+
+To reuse a browser across runs, pass a ``BrowserConfig`` that connects to
+an already running browser (``cdp_url``) as ``browser_config``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
+from crawl4ai.content_scraping_strategy import LXMLWebScrapingStrategy
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+
+from backend.html_parsing import parse_html
+from backend.http_cache import default_cache
+from backend.http_client import ResponseTooLarge, UnexpectedContentType
+from backend.politeness import HostScheduler
+from backend.webscraper import HEADERS, HTML_CONTENT_TYPES, MAX_BODY_BYTES
+
+# Number of browsers kept running and URLs crawled at the same time.
+DEFAULT_BROWSERS = 1
+DEFAULT_CONCURRENCY = 4
+
+# Pages with less visible text than this (in characters) that contain
+# scripts are assumed to be rendered on the client.
+MIN_STATIC_TEXT = 200
+
+_SCRIPT_TAGS = ("script", "style", "noscript", "template")
+
+
+@dataclass
+class HttpCrawlResult:
+    """Result of a page fetched without a browser.
+
+    Provides the attributes of crawl4ai's ``CrawlResult`` used by the rest
+    of the backend.
+    """
+
+    url: str
+    html: str
+    success: bool = True
+    metadata: dict[str, Any] = field(default_factory=dict)
+    session_id: Optional[str] = None
+    extracted_content: Optional[str] = None
+    markdown: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+def needs_browser(html: str, min_text: int = MIN_STATIC_TEXT) -> bool:
+    """Return ``True`` if ``html`` has to be rendered by a browser.
+
+    This is the case if the page carries hardly any visible text but
+    contains scripts, i.e. its content is generated on the client.
+    """
+    root = parse_html(html)
+    if root is None:
+        return True
+    has_scripts = root.find(".//script") is not None
+    for element in list(root.iter(*_SCRIPT_TAGS)):
+        element.drop_tree()
+    text = "".join(fragment.strip() for fragment in root.itertext())
+    return has_scripts and len(text) < min_text
+
+
+class CrawlerService:
+    """Crawl URLs via plain HTTP or a pool of warm crawl4ai browsers.
+
+    Parameters
+    ----------
+    browsers : int, default ``DEFAULT_BROWSERS``
+        Number of browsers started by ``start``.  They are launched lazily,
+        i.e. only once the first page needs rendering.
+    max_concurrency : int, default ``DEFAULT_CONCURRENCY``
+        Maximum number of URLs crawled at the same time.
+    browser_config : BrowserConfig, optional
+        Configuration of the browsers (headless by default).
+    run_config : CrawlerRunConfig, optional
+        Configuration used for every browser crawl.
+    browser_hosts : iterable of str, optional
+        Hosts that are always rendered in the browser.
+    scheduler : HostScheduler, optional
+        Politeness scheduler applied to every fetch.
+    headers : mapping, default ``webscraper.HEADERS``
+        Headers sent with plain HTTP requests.
+
+    Use it as an async context manager (or call ``start``/``close``) so that
+    the browsers are shut down at the end.
+    """
+
+    def __init__(
+        self,
+        browsers: int = DEFAULT_BROWSERS,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        browser_config: Optional[BrowserConfig] = None,
+        run_config: Optional[CrawlerRunConfig] = None,
+        browser_hosts: Iterable[str] = (),
+        scheduler: Optional[HostScheduler] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> None:
+        self.browsers = max(1, browsers)
+        self.browser_config = browser_config or BrowserConfig(headless=True)
+        self.run_config = run_config or CrawlerRunConfig(scraping_strategy=LXMLWebScrapingStrategy())
+        self.browser_hosts = set(browser_hosts)
+        self.scheduler = scheduler
+        self.headers = HEADERS if headers is None else headers
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._crawlers: list[AsyncWebCrawler] = []
+        self._next_crawler: Optional[itertools.cycle] = None
+        self._start_lock = asyncio.Lock()
+        self._markdown = DefaultMarkdownGenerator()
+
+    async def start(self) -> "CrawlerService":
+        """Launch the browser pool (no-op if it is already running)."""
+        async with self._start_lock:
+            if not self._crawlers:
+                for _ in range(self.browsers):
+                    crawler = AsyncWebCrawler(config=self.browser_config)
+                    await crawler.start()
+                    self._crawlers.append(crawler)
+                self._next_crawler = itertools.cycle(self._crawlers)
+        return self
+
+    async def close(self) -> None:
+        """Shut down all browsers of the pool."""
+        crawlers, self._crawlers = self._crawlers, []
+        self._next_crawler = None
+        for crawler in crawlers:
+            await crawler.close()
+
+    async def __aenter__(self) -> "CrawlerService":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    # -- fetching ----------------------------------------------------------
+
+    def _fetch_http(self, url: str) -> Optional[HttpCrawlResult]:
+        """Fetch ``url`` directly; ``None`` if it has to be rendered in the browser."""
+        try:
+            resp = default_cache.get(
+                url,
+                headers=self.headers,
+                timeout=10,
+                max_bytes=MAX_BODY_BYTES,
+                content_types=HTML_CONTENT_TYPES,
+            )
+        except (UnexpectedContentType, ResponseTooLarge) as exc:
+            return HttpCrawlResult(url, "", success=False, error_message=str(exc))
+        except Exception as exc:
+            print(f"Direct fetch of {url} failed: {exc}")
+            return HttpCrawlResult(url, "", success=False, error_message=str(exc))
+        if resp.status_code != 200:
+            return HttpCrawlResult(url, "", success=False, error_message=f"status code {resp.status_code}")
+        if needs_browser(resp.text):
+            return None
+        try:
+            markdown = self._markdown.generate_markdown(resp.text, base_url=url).raw_markdown
+        except Exception:  # pragma: no cover - markdown is optional
+            markdown = None
+        return HttpCrawlResult(url, resp.text, markdown=markdown)
+
+    async def _render(self, url: str, config: Optional[CrawlerRunConfig]) -> Any:
+        await self.start()
+        crawler = next(self._next_crawler)
+        return await crawler.arun(url, config=config or self.run_config)
+
+    async def crawl(self, url: str, config: Optional[CrawlerRunConfig] = None, depth: int = 0) -> Any:
+        """Crawl one URL and return its (crawl4ai-compatible) result.
+
+        The result's ``metadata`` records the ``depth`` and whether the page
+        was fetched via ``"http"`` or the ``"browser"``.
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        if self.scheduler is not None:
+            if not await self.scheduler.allowed(url):
+                return HttpCrawlResult(url, "", success=False, error_message="disallowed by robots.txt")
+            # Wait for the host's turn before taking a slot, so that a slow
+            # host does not hold slots that other hosts could use.
+            await self.scheduler.acquire(url)
+        async with self._semaphore:
+            result = None
+            if host not in self.browser_hosts:
+                result = await asyncio.to_thread(self._fetch_http, url)
+            fetched_with = "http"
+            if result is None:
+                self.browser_hosts.add(host)
+                result = await self._render(url, config)
+                fetched_with = "browser"
+        result.metadata = {**(result.metadata or {}), "depth": depth, "fetched_with": fetched_with}
+        return result
+
+    async def crawl_many(
+        self,
+        urls: Iterable[str],
+        config: Optional[CrawlerRunConfig] = None,
+        depth: int = 0,
+    ) -> list[Any]:
+        """Crawl ``urls`` concurrently (up to ``max_concurrency`` at a time).
+
+        Returns the results in the order of ``urls``.
+        """
+        return list(await asyncio.gather(*(self.crawl(url, config, depth) for url in urls)))
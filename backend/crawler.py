@@ -1,28 +1,40 @@
+import argparse
 import asyncio
-import json
 import os
+from fnmatch import fnmatch
 from urllib.parse import urlparse
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
-from crawl4ai.deep_crawling import BFSDeepCrawlStrategy
-from crawl4ai.content_scraping_strategy import LXMLWebScrapingStrategy
-from crawl4ai.deep_crawling.filters import URLPatternFilter, FilterChain
 
-def process_result(result, filename):
+from backend.blob_store import BlobStore, LazyRecord, externalize
+from backend.crawl_service import CrawlerService
+from backend.discovery import discover_event_urls, load_lastmod_state, save_lastmod_state
+from backend.html_parsing import parse_page
+from backend.result_store import ResultStore
+from backend.visited import canonicalize_url
+
+# Event listing pages the crawl starts from.
+SEED_URLS = ["https://www.vmp.ethz.ch/en/events/alle_events"]
+
+# Linked pages are only crawled if their URL matches one of these patterns.
+EVENT_PATTERNS = ["*events*"]
+
+# Sitemap ``lastmod`` values of the pages crawled in discovery mode.
+LASTMOD_FILE = os.path.join('data', 'crawler_sitemap_lastmod.json')
+
+# Large page payloads that are kept in the blob store instead of the records.
+BLOB_FIELDS = ("html", "extracted_content", "markdown")
+
+def process_result(result, store, blobs):
     '''
-    Process the crawled result and append it to a document within data/{filename}.
-    This json has the following structure:
-    [
-        {
-            "url": "seed-url/<page-id>",
-            "session_id": "<session-id>",
-            "success": true,
-            "metadata": {},
-            "html": "<html-content>",
-            "extracted_content": "<extracted-content>",
-            "markdown": "## Extracted Markdown Content ..."
-        },
+    Process the crawled result and append it to the result store.
+    Every result is stored as one JSON object per line:
+
+        {"url": "seed-url/<page-id>", "session_id": "<session-id>", "success": true, "metadata": {}, "html_sha256": "<digest>", "extracted_content_sha256": "<digest>", "markdown_sha256": "<digest>"}
         ...
-    ]
+
+    Appending a line keeps the cost per page constant, no matter how many
+    pages have been crawled before.  The html, extracted content and markdown
+    are stored in the content-addressed blob store and only referenced by
+    their digest, so identical pages are stored once.
     '''
     new_data = {
         "url": result.url,
@@ -34,68 +46,102 @@ def process_result(result, filename):
         "markdown": result.markdown
     }
 
-    filepath = os.path.join('data', filename)
-    
-    # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
-
-    # Read existing data
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            try:
-                all_data = json.load(f)
-            except json.JSONDecodeError:
-                all_data = []
-    else:
-        all_data = []
-
-    # Append new data
-    all_data.append(new_data)
-
-    # Write all data back to the file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, ensure_ascii=False, indent=4)
-
-async def event_crawler():
-    # Configure a 2-level deep crawl
-    url_filter = URLPatternFilter(patterns = ["*events*"])
-    config = CrawlerRunConfig(
-        deep_crawl_strategy=BFSDeepCrawlStrategy(
-            max_depth=1, 
-            filter_chain = FilterChain([url_filter])
-        ),
-        scraping_strategy=LXMLWebScrapingStrategy(),
-        verbose=True
-    )
+    store.append(externalize(new_data, blobs, BLOB_FIELDS))
 
-    async with AsyncWebCrawler() as crawler:
-        results = await crawler.arun("https://www.vmp.ethz.ch/en/events/alle_events", config=config)
+def iter_crawl_records(store, blobs):
+    '''
+    Stream the records of ``store`` back as read-only mappings.
+    The blob fields (e.g. ``record["html"]``) are only loaded from the blob
+    store when they are accessed.
+    '''
+    for record in store:
+        yield LazyRecord(record, blobs)
 
-        print(f"Crawled {len(results)} pages in total")
-    
-    return results
+async def event_crawler(service=None, seeds=SEED_URLS, patterns=EVENT_PATTERNS, lastmod_state=None):
+    '''
+    Crawl the seed pages and the event pages they link to (depth 1).
+    All seeds are crawled concurrently through ``service``, a shared
+    ``CrawlerService`` whose browsers stay warm across seeds and calls; a
+    temporary one is used if none is given.  Linked pages are followed if
+    they are on the seed's host and match one of ``patterns``.
 
-    
+    With ``lastmod_state`` (``lastmod`` per canonical URL, see
+    ``backend.discovery``) the links are not followed blindly: only the
+    event-detail pages announced by the seeds' sitemaps and linked from the
+    seed pages are crawled, skipping pages whose ``lastmod`` is unchanged.
+    ``lastmod_state`` is updated in place for the pages crawled successfully.
+    '''
+    if service is None:
+        async with CrawlerService() as service:
+            return await event_crawler(service, seeds, patterns, lastmod_state)
+
+    seeds = list(seeds)
+    if lastmod_state is not None:
+        urls, lastmods = await asyncio.to_thread(
+            discover_event_urls, seeds, lastmod_state, listings=seeds, headers=service.headers
+        )
+        print(f"Discovered {len(urls)} new or changed event pages")
+        results = await service.crawl_many(urls, depth=1)
+        for url, result in zip(urls, results):
+            key = canonicalize_url(url)
+            if result.success and key in lastmods:
+                lastmod_state[key] = lastmods[key]
+        return results
+
+    seed_results = await service.crawl_many(seeds)
+
+    links = {}
+    for seed, result in zip(seeds, seed_results):
+        if not result.success or not result.html:
+            continue
+        host = urlparse(seed).netloc
+        for link in parse_page(result.html, result.url).links:
+            if urlparse(link).netloc == host and any(fnmatch(link, pattern) for pattern in patterns):
+                links.setdefault(link, None)
+    links = [link for link in links if link not in seeds]
+
+    results = seed_results + await service.crawl_many(links, depth=1)
+    print(f"Crawled {len(results)} pages in total")
 
-async def main():
-    
-    results = await event_crawler()
+    return results
+
+async def main(discover=False):
+    '''
+    Crawl the seed pages and store the results.
+    With ``discover`` only new or changed event pages are crawled (see
+    ``event_crawler``) and their results are appended to the previous ones.
+    '''
+    lastmod_state = load_lastmod_state(LASTMOD_FILE) if discover else None
+    results = await event_crawler(lastmod_state=lastmod_state)
 
     print(f"Crawled {len(results)} pages in total")
 
-    # Define the output filename
-    output_filename = "crawled_data_test.json"
-    filepath = os.path.join('data', output_filename)
+    # Define the output filename (use a ".jsonl.gz" or ".jsonl.zst" suffix for a compressed store)
+    output_filename = "crawled_data_test.jsonl"
+    store = ResultStore(os.path.join('data', output_filename))
+    # Blobs are kept across runs so that unchanged pages are not stored again.
+    blobs = BlobStore()
 
-    # Clear the file before starting
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    # Clear the file before starting, unless only changed pages were crawled
+    if not discover:
+        store.clear()
 
     # Access individual results
-    for result in results:  # Show all results
-        print(f"URL: {result.url}")
-        print(f"Depth: {result.metadata.get('depth', 0)}")   
-        process_result(result, output_filename)
+    with store:
+        for result in results:  # Show all results
+            print(f"URL: {result.url}")
+            print(f"Depth: {result.metadata.get('depth', 0)}")   
+            process_result(result, store, blobs)
+
+    # Record the lastmod values only once the results have been stored.
+    if discover:
+        save_lastmod_state(LASTMOD_FILE, lastmod_state)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Crawl event pages with crawl4ai.")
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        help="only crawl changed event pages listed in sitemaps and the seed pages",
+    )
+    asyncio.run(main(discover=parser.parse_args().discover))
@@ -0,0 +1,238 @@
+"""Discovery of event pages from sitemaps and event listing pages.
+
+Instead of following every link of a site, the crawler can be seeded with
+the event-detail URLs a site announces itself:
+
+* ``sitemap.xml`` files (including sitemap indexes and the ``Sitemap:``
+  lines of ``robots.txt``) list the pages of a site together with their
+  ``lastmod`` date.  Pages whose ``lastmod`` is unchanged since the last
+  crawl are not fetched again.
+* Known event listing pages link to the individual events.  Their links are
+  collected without following them any further.
+
+Only URLs that look like event-detail pages (see ``EVENT_URL_PATTERNS``)
+are returned.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import gzip
+import json
+import urllib.parse
+import urllib.robotparser
+from pathlib import Path
+from typing import Container, Iterable, Iterator, Mapping, Optional, Tuple, Union
+
+import lxml.etree
+
+from backend.html_parsing import parse_page
+from backend.http_cache import default_cache
+from backend.visited import canonicalize_url
+
+# URL patterns (shell-style, case-insensitive) of event-detail pages.  The
+# listing pages themselves (e.g. ``.../events``) do not match.
+EVENT_URL_PATTERNS = (
+    "*/event/*",
+    "*/events/*",
+    "*/veranstaltung/*",
+    "*/veranstaltungen/*",
+)
+
+# Upper bound for the number of sitemap files read per site, which also
+# protects against sitemap indexes that reference each other.
+MAX_SITEMAPS = 50
+
+_XML_PARSER = lxml.etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+
+
+def is_event_url(url: str, patterns: Iterable[str] = EVENT_URL_PATTERNS) -> bool:
+    """Return ``True`` if ``url`` matches one of the event-detail ``patterns``."""
+    url = url.lower()
+    return any(fnmatch.fnmatchcase(url, pattern.lower()) for pattern in patterns)
+
+
+def _local_name(tag: object) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def parse_sitemap(body: bytes) -> Tuple[list[Tuple[str, Optional[str]]], list[str]]:
+    """Parse a sitemap or sitemap index.
+
+    Returns the ``(url, lastmod)`` pairs of a ``<urlset>`` and the locations
+    of the sitemaps referenced by a ``<sitemapindex>``; gzip-compressed
+    sitemaps are decompressed first.
+    """
+    if body.startswith(b"\x1f\x8b"):
+        body = gzip.decompress(body)
+    root = lxml.etree.fromstring(body, _XML_PARSER) if body.strip() else None
+    if root is None:
+        return [], []
+
+    pages: list[Tuple[str, Optional[str]]] = []
+    sitemaps: list[str] = []
+    for entry in root:
+        kind = _local_name(entry.tag)
+        if kind not in ("url", "sitemap"):
+            continue
+        fields = {_local_name(child.tag): (child.text or "").strip() for child in entry}
+        loc = fields.get("loc")
+        if not loc:
+            continue
+        if kind == "url":
+            pages.append((loc, fields.get("lastmod") or None))
+        else:
+            sitemaps.append(loc)
+    return pages, sitemaps
+
+
+def sitemap_urls(site_url: str, headers: Optional[Mapping[str, str]] = None) -> list[str]:
+    """Return the sitemaps of the site ``site_url`` belongs to.
+
+    These are the ``Sitemap:`` entries of its ``robots.txt`` or, if there
+    are none, ``/sitemap.xml``.
+    """
+    parts = urllib.parse.urlsplit(site_url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    robots = urllib.robotparser.RobotFileParser()
+    try:
+        response = default_cache.get(f"{origin}/robots.txt", headers=headers, timeout=10)
+        if response.status_code == 200:
+            robots.parse(response.text.splitlines())
+    except Exception as exc:
+        print(f"Could not read robots.txt of {origin}: {exc}")
+    return list(robots.site_maps() or []) or [f"{origin}/sitemap.xml"]
+
+
+def iter_sitemap_entries(
+    sitemaps: Iterable[str],
+    headers: Optional[Mapping[str, str]] = None,
+    max_sitemaps: int = MAX_SITEMAPS,
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """Yield ``(url, lastmod)`` for all pages listed in ``sitemaps``.
+
+    Sitemap indexes are followed recursively.  Only pages on the host of the
+    sitemap that lists them are reported.  Sitemaps are fetched through the
+    HTTP cache, so unchanged sitemaps cost a conditional request only.
+    """
+    queue = list(sitemaps)
+    seen: set[str] = set()
+    while queue and len(seen) < max_sitemaps:
+        sitemap = queue.pop(0)
+        if sitemap in seen:
+            continue
+        seen.add(sitemap)
+        try:
+            response = default_cache.get(sitemap, headers=headers, timeout=10)
+            if response.status_code != 200:
+                print(f"Skipping sitemap {sitemap} due to status code {response.status_code}")
+                continue
+            pages, children = parse_sitemap(response.content)
+        except Exception as exc:
+            print(f"Could not read sitemap {sitemap}: {exc}")
+            continue
+        queue.extend(children)
+        host = urllib.parse.urlsplit(sitemap).netloc
+        for url, lastmod in pages:
+            if urllib.parse.urlsplit(url).netloc == host:
+                yield url, lastmod
+
+
+def listing_links(listing_url: str, headers: Optional[Mapping[str, str]] = None) -> list[str]:
+    """Return the same-domain links of the listing page ``listing_url``."""
+    try:
+        response = default_cache.get(listing_url, headers=headers, timeout=10)
+        if response.status_code != 200:
+            print(f"Skipping listing {listing_url} due to status code {response.status_code}")
+            return []
+    except Exception as exc:
+        print(f"Could not read listing {listing_url}: {exc}")
+        return []
+    host = urllib.parse.urlsplit(listing_url).netloc
+    links = parse_page(response.text, listing_url).links
+    return [link for link in links if urllib.parse.urlsplit(link).netloc == host]
+
+
+def load_lastmod_state(filename: Union[str, Path]) -> dict[str, str]:
+    """Load the ``lastmod`` values recorded by the previous crawl."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as exc:  # pragma: no cover - best effort
+        print(f"Could not load sitemap state from {filename}: {exc}")
+        return {}
+
+
+def save_lastmod_state(filename: Union[str, Path], state: Mapping[str, str]) -> None:
+    """Persist the ``lastmod`` values of the fetched pages."""
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(state.items())), f, indent=2, ensure_ascii=False)
+
+
+def discover_event_urls(
+    sites: Iterable[str],
+    lastmod_state: Mapping[str, str],
+    listings: Iterable[str] = (),
+    known: Optional[Container[str]] = None,
+    patterns: Iterable[str] = EVENT_URL_PATTERNS,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Tuple[list[str], dict[str, str]]:
+    """Collect the event-detail URLs of ``sites`` that need to be fetched.
+
+    Parameters
+    ----------
+    sites : iterable of str
+        URLs of the sites whose sitemaps are read.
+    lastmod_state : mapping
+        ``lastmod`` per canonical URL as recorded by the previous crawl.
+        Sitemap entries with the same ``lastmod`` are skipped.
+    listings : iterable of str, optional
+        Event listing pages whose links are collected.
+    known : container, optional
+        URLs fetched before (e.g. the ``VisitedIndex``).  Pages without a
+        ``lastmod`` are skipped if they are contained in it.
+    patterns : iterable of str, default ``EVENT_URL_PATTERNS``
+        Patterns that event-detail URLs match.
+    headers : mapping, optional
+        Headers sent with every request.
+
+    Returns
+    -------
+    urls : list of str
+        URLs to fetch (as announced by the site), in discovery order.
+    lastmods : dict
+        ``lastmod`` per canonical URL for those URLs that have one; record
+        them with ``save_lastmod_state`` once the pages have been fetched.
+    """
+    patterns = tuple(patterns)
+    urls: dict[str, None] = {}
+    lastmods: dict[str, str] = {}
+    seen: set[str] = set()
+
+    def consider(url: str, lastmod: Optional[str]) -> None:
+        # The canonical form only identifies the page; the URL itself is
+        # fetched so that e.g. its trailing slash is preserved.
+        key = canonicalize_url(url)
+        if key in seen or not is_event_url(key, patterns):
+            return
+        seen.add(key)
+        if lastmod is not None:
+            if lastmod_state.get(key) == lastmod:
+                return
+            lastmods[key] = lastmod
+        elif known is not None and key in known:
+            return
+        urls[urllib.parse.urldefrag(url)[0]] = None
+
+    origins = dict.fromkeys(
+        "{0.scheme}://{0.netloc}".format(urllib.parse.urlsplit(site)) for site in sites
+    )
+    sitemaps = [sitemap for origin in origins for sitemap in sitemap_urls(origin, headers)]
+    for url, lastmod in iter_sitemap_entries(sitemaps, headers):
+        consider(url, lastmod)
+    for listing in listings:
+        for url in listing_links(listing, headers):
+            consider(url, None)
+    return list(urls), lastmods
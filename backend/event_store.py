@@ -0,0 +1,306 @@
+"""Embedded SQLite store for extracted events.
+
+Events from all sources (the AMIV API, crawled websites) are kept in one
+database instead of being rewritten as a whole JSON file on every run:
+
+* ``sources`` lists where events come from,
+* ``events`` holds one row per event URL with the columns used for lookups
+  (date, times, title, location) and the full record as JSON,
+* ``refreshments`` holds one row per matched refreshment keyword so that
+  events can be selected by category.
+
+Records are upserted in bulk inside one transaction and can be queried by
+date range, refreshment category, source and text through indexes.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping, Optional, Union
+
+# Default location of the database.
+EVENT_STORE_FILE = Path(__file__).resolve().parent.parent / "data" / "apero_events.sqlite3"
+
+# Number of records written per transaction by ``store_events``.
+DEFAULT_BATCH_SIZE = 500
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    source_id INTEGER NOT NULL REFERENCES sources (id),
+    title TEXT,
+    date TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    location TEXT,
+    record TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_date ON events (date, start_time);
+CREATE INDEX IF NOT EXISTS events_source ON events (source_id, date);
+CREATE TABLE IF NOT EXISTS refreshments (
+    event_id INTEGER NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    PRIMARY KEY (event_id, category, keyword)
+);
+CREATE INDEX IF NOT EXISTS refreshments_category ON refreshments (category, event_id);
+"""
+
+# Start of an event as compared against time windows, see ``prune``.
+_START_SQL = "e.date || 'T' || COALESCE(NULLIF(e.start_time, ''), '00:00') || ':00Z'"
+
+
+def _date(value: Any) -> Optional[str]:
+    """Return ``value`` if it is a ``YYYY-MM-DD`` date (e.g. not ``"Not found"``)."""
+    return value if isinstance(value, str) and _DATE_RE.match(value) else None
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class EventStore:
+    """Events of all sources stored in SQLite.
+
+    Parameters
+    ----------
+    path : str or Path, default ``EVENT_STORE_FILE``
+        Database file; ``":memory:"`` keeps the store in memory only.
+    """
+
+    def __init__(self, path: Union[str, Path] = EVENT_STORE_FILE) -> None:
+        self.path = path
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self._sources: dict[str, int] = dict(self._db.execute("SELECT name, id FROM sources"))
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "EventStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM events").fetchone()
+        return count
+
+    def _source_id(self, name: str) -> int:
+        if name not in self._sources:
+            self._db.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)", (name,))
+            (self._sources[name],) = self._db.execute(
+                "SELECT id FROM sources WHERE name = ?", (name,)
+            ).fetchone()
+        return self._sources[name]
+
+    # -- writing -----------------------------------------------------------
+
+    def upsert(self, records: Iterable[Mapping[str, Any]], source: Optional[str] = None) -> int:
+        """Insert or replace ``records`` (identified by their ``url``).
+
+        Parameters
+        ----------
+        records : iterable of mapping
+            Event records as produced by ``amiv_api.extract_event_fields`` or
+            the web scraper.  Records without ``url`` are ignored.
+        source : str, optional
+            Name of the source; defaults to the host of each record's URL.
+
+        Returns the number of stored records.  All records are written in
+        one transaction.
+        """
+        count = 0
+        now = time.time()
+        self._db.execute("BEGIN")
+        try:
+            for record in records:
+                url = record.get("url")
+                if not url:
+                    continue
+                source_id = self._source_id(source or urllib.parse.urlsplit(url).netloc)
+                (event_id,) = self._db.execute(
+                    "INSERT INTO events (url, source_id, title, date, start_time, end_time, location, record, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (url) DO UPDATE SET source_id = excluded.source_id, title = excluded.title, "
+                    "date = excluded.date, start_time = excluded.start_time, end_time = excluded.end_time, "
+                    "location = excluded.location, record = excluded.record, updated = excluded.updated "
+                    "RETURNING id",
+                    (
+                        url,
+                        source_id,
+                        record.get("title"),
+                        _date(record.get("date")),
+                        record.get("start_time"),
+                        record.get("end_time"),
+                        record.get("location"),
+                        json.dumps(record, ensure_ascii=False),
+                        now,
+                    ),
+                ).fetchone()
+                self._db.execute("DELETE FROM refreshments WHERE event_id = ?", (event_id,))
+                matches = (record.get("refreshment_details") or {}).get("matches") or {}
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO refreshments (event_id, category, keyword) VALUES (?, ?, ?)",
+                    [(event_id, category, keyword) for category, keywords in matches.items() for keyword in keywords],
+                )
+                count += 1
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            # Forget sources whose insertion was rolled back.
+            self._sources = dict(self._db.execute("SELECT name, id FROM sources"))
+            raise
+        self._db.execute("COMMIT")
+        return count
+
+    def prune(
+        self,
+        source: str,
+        keep: Iterable[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> int:
+        """Delete the events of ``source`` whose URL is not in ``keep``.
+
+        With ``start``/``end`` (timestamps like ``"2024-05-01T00:00:00Z"``)
+        only events starting within that window are considered, which
+        mirrors ``amiv_api.replace_window``.  Returns the number of deleted
+        events.
+        """
+        if source not in self._sources:
+            return 0
+        conditions = ["e.source_id = ?"]
+        params: list[Any] = [self._sources[source]]
+        if start is not None or end is not None:
+            conditions.append("e.date IS NOT NULL")
+        if start is not None:
+            conditions.append(f"{_START_SQL} >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{_START_SQL} < ?")
+            params.append(end)
+
+        self._db.execute("BEGIN")
+        try:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS keep_urls (url TEXT PRIMARY KEY)")
+            self._db.execute("DELETE FROM keep_urls")
+            self._db.executemany("INSERT OR IGNORE INTO keep_urls VALUES (?)", ((url,) for url in keep))
+            cursor = self._db.execute(
+                f"DELETE FROM events WHERE id IN (SELECT e.id FROM events AS e "
+                f"WHERE {' AND '.join(conditions)} AND e.url NOT IN (SELECT url FROM keep_urls))",
+                params,
+            )
+            self._db.execute("DELETE FROM keep_urls")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return cursor.rowcount
+
+    # -- queries -----------------------------------------------------------
+
+    def get(self, url: str) -> Optional[dict[str, Any]]:
+        """Return the record stored for ``url`` (or ``None``)."""
+        row = self._db.execute("SELECT record FROM events WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        category: Optional[str] = None,
+        source: Optional[str] = None,
+        text: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield the records matching all given criteria, ordered by start.
+
+        Parameters
+        ----------
+        start, end : str, optional
+            Date range ``start <= date <= end`` (``YYYY-MM-DD``).  Events
+            without a known date only match queries without a date range.
+        category : str, optional
+            Refreshment category, e.g. ``"drinks"``.
+        source : str, optional
+            Source name, e.g. ``"amiv"``.
+        text : str, optional
+            Case-insensitive substring of the title or location.
+        limit : int, optional
+            Maximum number of records.
+        """
+        conditions = []
+        params: list[Any] = []
+        if start is not None:
+            conditions.append("e.date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("e.date <= ?")
+            params.append(end)
+        if category is not None:
+            conditions.append("e.id IN (SELECT event_id FROM refreshments WHERE category = ?)")
+            params.append(category)
+        if source is not None:
+            conditions.append("e.source_id = (SELECT id FROM sources WHERE name = ?)")
+            params.append(source)
+        if text:
+            conditions.append("(e.title LIKE ? ESCAPE '\\' OR e.location LIKE ? ESCAPE '\\')")
+            params += [_like_pattern(text)] * 2
+
+        sql = "SELECT e.record FROM events AS e"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY e.date IS NULL, e.date, e.start_time, e.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for (record,) in self._db.execute(sql, params):
+            yield json.loads(record)
+
+    def categories(self) -> dict[str, int]:
+        """Return the number of events per refreshment category."""
+        return dict(self._db.execute(
+            "SELECT category, COUNT(DISTINCT event_id) FROM refreshments GROUP BY category ORDER BY category"
+        ))
+
+
+def store_events(
+    store: EventStore,
+    records: Iterable[Mapping[str, Any]],
+    source: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Mapping[str, Any]]:
+    """Pass ``records`` through while upserting them into ``store`` in batches.
+
+    Lets a streaming export (e.g. ``export.write_json_array``) fill the store
+    at the same time without collecting all records first.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        yield record
+        if len(batch) >= batch_size:
+            store.upsert(batch, source)
+            batch = []
+    if batch:
+        store.upsert(batch, source)
@@ -0,0 +1,267 @@
+"""Writers that stream extracted events to disk.
+
+Records are written one at a time as they are produced, so memory use does
+not depend on the number of events.  Output goes to a temporary ``.part``
+file next to the target which replaces the target only once the stream is
+complete; readers of the target therefore never see a half-written file.
+
+``MonthShardWriter`` (and ``write_month_shards``) splits a result set into
+compact per-month files for the frontend.  It also streams the records, so
+it can be fed from the same stream as ``write_json_array``, and it only
+replaces the shards whose content changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Mapping, Optional, Union
+
+PathLike = Union[str, Path]
+
+# Name of the manifest written next to the month shards.
+MANIFEST_NAME = "manifest.json"
+
+_MONTH_RE = re.compile(r"(\d{4}-\d{2})-\d{2}$")
+_SHARD_RE = re.compile(r"\d{4}-\d{2}\.json$")
+
+
+def _part_path(path: Path) -> Path:
+    return path.with_name(path.name + ".part")
+
+
+def write_json_array(path: PathLike, records: Iterable[Any], indent: int = 2) -> int:
+    """Stream ``records`` into ``path`` as a JSON array.
+
+    The output is identical to ``json.dump(list(records), f, indent=indent,
+    ensure_ascii=False)`` (use ``indent=None`` for a compact array).
+
+    Returns
+    -------
+    int
+        Number of records written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = _part_path(path)
+    separator = ",\n" if indent is not None else ", "
+    prefix = " " * indent if indent is not None else ""
+    count = 0
+    try:
+        with part.open("w", encoding="utf-8") as f:
+            f.write("[")
+            for record in records:
+                encoded = json.dumps(record, ensure_ascii=False, indent=indent)
+                if indent is not None:
+                    # JSON strings cannot contain raw newlines, so indenting
+                    # every line nests the record correctly inside the array.
+                    encoded = "\n".join(prefix + line for line in encoded.split("\n"))
+                f.write(separator if count else ("\n" if indent is not None else ""))
+                f.write(encoded)
+                count += 1
+            if count and indent is not None:
+                f.write("\n")
+            f.write("]")
+        os.replace(part, path)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return count
+
+
+def write_json_lines(path: PathLike, records: Iterable[Any]) -> int:
+    """Stream ``records`` into ``path`` as JSON Lines (one object per line).
+
+    Returns
+    -------
+    int
+        Number of records written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = _part_path(path)
+    count = 0
+    try:
+        with part.open("w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+        os.replace(part, path)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return count
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    part = _part_path(path)
+    try:
+        part.write_bytes(data)
+        os.replace(part, path)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+
+def compact_record(record: Mapping[str, Any]) -> dict[str, Any]:
+    """Return ``record`` without redundant or empty fields.
+
+    The refreshment summary is kept once (as ``refreshments``) instead of
+    also inside ``refreshment_details``, and fields without a value are
+    left out.
+    """
+    compact = {}
+    for key, value in record.items():
+        if key == "refreshment_details" and isinstance(value, Mapping):
+            value = {name: item for name, item in value.items() if name != "summary" and item}
+        if value in (None, "") or value == {} or value == []:
+            continue
+        compact[key] = value
+    return compact
+
+
+class _ShardPart:
+    """Temporary file a month's shard is streamed into."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.file: BinaryIO = _part_path(path).open("wb")
+        self.digest = hashlib.sha256()
+        self.count = 0
+        self._write(b"[")
+
+    def _write(self, data: bytes) -> None:
+        self.file.write(data)
+        self.digest.update(data)
+
+    def add(self, record: Mapping[str, Any]) -> None:
+        if self.count:
+            self._write(b",")
+        self._write(json.dumps(compact_record(record), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self.count += 1
+
+    def finish(self) -> str:
+        """Close the file and return the hash of its content."""
+        self._write(b"]")
+        self.file.close()
+        return self.digest.hexdigest()[:16]
+
+
+class MonthShardWriter:
+    """Stream records into one compact JSON file per month plus a manifest.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory of the shards and the manifest.
+
+    Records passed to ``add`` (or through ``passthrough``) are grouped by the
+    month of their ``date`` (``YYYY-MM-DD``); records without a valid date
+    are skipped.  Each month is written to ``<directory>/<YYYY-MM>.json``
+    without indentation (see ``compact_record``), so a client only downloads
+    the months it shows.  The records are appended to a temporary file per
+    month as they arrive, so memory use does not depend on their number.
+
+    ``close`` (called when the ``with`` block ends without an error)
+    replaces only the shards whose content changed and writes
+    ``<directory>/manifest.json``, which maps every month to the shard's
+    URL (relative to the manifest), its number of events and a hash of its
+    content that clients can use to bust caches.  Shards of months that no
+    longer have events are removed.  After an error the previous shards are
+    kept as they are.
+    """
+
+    def __init__(self, directory: PathLike) -> None:
+        self.directory = Path(directory)
+        self.manifest: Optional[dict[str, Any]] = None
+        self.changed: list[str] = []
+        self._parts: dict[str, _ShardPart] = {}
+
+    def __enter__(self) -> "MonthShardWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, record: Mapping[str, Any]) -> None:
+        """Append ``record`` to the shard of its month."""
+        match = _MONTH_RE.match(str(record.get("date") or ""))
+        if not match:
+            return
+        part = self._parts.get(match.group(1))
+        if part is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            part = _ShardPart(self.directory / f"{match.group(1)}.json")
+            self._parts[match.group(1)] = part
+        part.add(record)
+
+    def passthrough(self, records: Iterable[Mapping[str, Any]]) -> Iterator[Mapping[str, Any]]:
+        """Yield ``records`` while adding them, e.g. to ``write_json_array``."""
+        for record in records:
+            self.add(record)
+            yield record
+
+    def _previous_manifest(self) -> dict[str, Any]:
+        try:
+            return json.loads((self.directory / MANIFEST_NAME).read_bytes())
+        except (OSError, ValueError):
+            return {}
+
+    def close(self) -> dict[str, Any]:
+        """Replace the changed shards and the manifest; returns the manifest."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        previous = self._previous_manifest()
+        manifest: dict[str, Any] = {"months": {}}
+        parts, self._parts = self._parts, {}
+        for month in sorted(parts):
+            part = parts[month]
+            digest = part.finish()
+            entry = {"url": part.path.name, "count": part.count, "hash": digest}
+            if previous.get("months", {}).get(month) == entry and part.path.exists():
+                _part_path(part.path).unlink()
+            else:
+                os.replace(_part_path(part.path), part.path)
+                self.changed.append(month)
+            manifest["months"][month] = entry
+
+        # The manifest is replaced last so that it never points to missing shards.
+        if manifest != previous:
+            _write_atomic(
+                self.directory / MANIFEST_NAME,
+                json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            )
+        for shard in self.directory.iterdir():
+            if _SHARD_RE.match(shard.name) and shard.stem not in manifest["months"]:
+                shard.unlink()
+        self.manifest = manifest
+        return manifest
+
+    def abort(self) -> None:
+        """Discard the shards written so far."""
+        parts, self._parts = self._parts, {}
+        for part in parts.values():
+            part.file.close()
+            _part_path(part.path).unlink(missing_ok=True)
+
+
+def write_month_shards(directory: PathLike, records: Iterable[Mapping[str, Any]]) -> dict[str, Any]:
+    """Write ``records`` into one compact JSON file per month plus a manifest.
+
+    See ``MonthShardWriter``.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    with MonthShardWriter(directory) as writer:
+        for record in records:
+            writer.add(record)
+    return writer.manifest
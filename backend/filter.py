@@ -1,30 +1,14 @@
 import asyncio
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
-from crawl4ai.deep_crawling import BFSDeepCrawlStrategy
-from crawl4ai.content_scraping_strategy import LXMLWebScrapingStrategy
-from crawl4ai.deep_crawling.filters import URLPatternFilter, FilterChain
 
-async def event_crawler():
-    # Configure a 2-level deep crawl
-    url_filter = URLPatternFilter(patterns = ["*events*"])
-    config = CrawlerRunConfig(
-        deep_crawl_strategy=BFSDeepCrawlStrategy(
-            max_depth=1, 
-            filter_chain = FilterChain([url_filter])
-        ),
-        scraping_strategy=LXMLWebScrapingStrategy(),
-        verbose=True
-    )
+from backend.crawler import event_crawler
 
-    async with AsyncWebCrawler() as crawler:
-        results = await crawler.arun("https://www.vmp.ethz.ch/en/events/alle_events", config=config)
+async def main():
+    results = await event_crawler()
 
-        print(f"Crawled {len(results)} pages in total")
-
-        # Access individual results
-        for result in results[:3]:  # Show first 3 results
-            print(f"URL: {result.url}")
-            print(f"Depth: {result.metadata.get('depth', 0)}")
+    # Access individual results
+    for result in results[:3]:  # Show first 3 results
+        print(f"URL: {result.url}")
+        print(f"Depth: {result.metadata.get('depth', 0)}")
 
 if __name__ == "__main__":
-    asyncio.run(event_crawler())
+    asyncio.run(main())
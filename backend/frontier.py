@@ -0,0 +1,144 @@
+"""Durable crawl frontier backed by SQLite.
+
+Every URL the crawler discovers is recorded together with its
+de-duplication key (usually its canonical form), its depth, the domain it
+is restricted to and its fetch state (``queued``, ``in_progress``,
+``done``, ``failed`` or ``skipped``).  Changes are committed immediately, so
+after a crash or Ctrl-C the crawl can be resumed exactly where it stopped:
+pages that were being fetched are simply queued again.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Collection, Iterator, Optional, Tuple, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    domain TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    result TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frontier_queue ON frontier (state, depth, seq);
+CREATE INDEX IF NOT EXISTS frontier_url ON frontier (url);
+"""
+
+
+class CrawlFrontier:
+    """Priority queue of URLs (shallowest first) persisted in SQLite.
+
+    Parameters
+    ----------
+    path : str or Path
+        Database file; ``":memory:"`` keeps the frontier in memory only.
+
+    Opening an existing database re-queues all URLs that were in progress
+    when the previous crawl stopped.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = path
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(frontier)")}
+        if columns and "key" not in columns:
+            # Frontier of an older version; only an interrupted crawl is lost.
+            self._db.execute("DROP TABLE frontier")
+        self._db.executescript(_SCHEMA)
+        self._db.execute(
+            "UPDATE frontier SET state = 'queued', updated = ? WHERE state = 'in_progress'",
+            (time.time(),),
+        )
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "CrawlFrontier":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def push(self, url: str, domain: str, depth: int, key: Optional[str] = None) -> bool:
+        """Queue ``url``; returns ``False`` if its ``key`` was already known.
+
+        ``url`` is the address that is fetched, ``key`` (default: ``url``)
+        identifies near-duplicate URLs, e.g. ``visited.canonicalize_url(url)``.
+        """
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO frontier (url, key, domain, depth, updated) VALUES (?, ?, ?, ?, ?)",
+            (url, url if key is None else key, domain, depth, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def pop(self, exclude: Collection[str] = ()) -> Optional[Tuple[str, str, int]]:
+        """Mark the next queued URL as in progress and return ``(url, domain, depth)``.
+
+        URLs of the domains in ``exclude`` (e.g. hosts that may not receive a
+        request yet) are passed over.
+        """
+        sql = "SELECT seq, url, domain, depth FROM frontier WHERE state = 'queued'"
+        if exclude:
+            sql += f" AND domain NOT IN ({', '.join('?' * len(exclude))})"
+        row = self._db.execute(sql + " ORDER BY depth, seq LIMIT 1", tuple(exclude)).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE frontier SET state = 'in_progress', updated = ? WHERE seq = ?",
+            (time.time(), row[0]),
+        )
+        return row[1], row[2], row[3]
+
+    def requeue(self, url: str) -> None:
+        """Put ``url``, which was popped but not fetched, back in the queue.
+
+        It keeps its position, i.e. it is handed out before URLs queued later.
+        """
+        self._db.execute(
+            "UPDATE frontier SET state = 'queued', updated = ? WHERE url = ? AND state = 'in_progress'",
+            (time.time(), url),
+        )
+
+    def mark(self, url: str, state: str, result: Any = None) -> None:
+        """Record the final ``state`` of ``url`` and an optional JSON ``result``."""
+        self._db.execute(
+            "UPDATE frontier SET state = ?, result = ?, updated = ? WHERE url = ?",
+            (state, json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), url),
+        )
+
+    def queued(self) -> int:
+        """Number of URLs waiting to be handed out by ``pop``."""
+        (count,) = self._db.execute("SELECT COUNT(*) FROM frontier WHERE state = 'queued'").fetchone()
+        return count
+
+    def pending(self) -> int:
+        """Number of URLs that still have to be fetched."""
+        (count,) = self._db.execute(
+            "SELECT COUNT(*) FROM frontier WHERE state IN ('queued', 'in_progress')"
+        ).fetchone()
+        return count
+
+    def urls(self, state: str) -> Iterator[str]:
+        """Yield all URLs in ``state``."""
+        for (url,) in self._db.execute("SELECT url FROM frontier WHERE state = ? ORDER BY seq", (state,)):
+            yield url
+
+    def results(self) -> Iterator[Any]:
+        """Yield the stored results in crawl order."""
+        for (result,) in self._db.execute(
+            "SELECT result FROM frontier WHERE result IS NOT NULL ORDER BY updated, seq"
+        ):
+            yield json.loads(result)
+
+    def clear(self) -> None:
+        """Forget all URLs, e.g. once a crawl has completed."""
+        self._db.execute("DELETE FROM frontier")
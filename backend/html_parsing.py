@@ -0,0 +1,165 @@
+"""Single-pass HTML parsing for the web scraper.
+
+Before a page is decoded, ``prefilter`` scans the raw response bytes once to
+decide whether it needs full event extraction, only link extraction, or no
+processing at all.
+
+The page is parsed once with ``lxml`` and a single walk over the element
+tree collects everything the scraper needs: the title, the links, the first
+``<time>`` element and the first element marked as location/venue.  The
+full page text is only assembled if the location has to be found by a text
+search.
+"""
+
+from __future__ import annotations
+
+import re
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Optional
+
+import lxml.etree
+import lxml.html
+
+# Mentions of an apero on a page (matched case-insensitively).
+KEYWORD_RE = re.compile(r"apero|aperitif", re.IGNORECASE)
+
+# Start of a link element.
+LINK_RE = re.compile(r"<a[\s>]", re.IGNORECASE)
+
+# Decisions of ``prefilter``.
+EXTRACT = "extract"
+LINKS = "links"
+SKIP = "skip"
+
+# Byte-level equivalents used by the pre-filter.  The keywords and ``<a`` are
+# plain ASCII and therefore encoded identically in UTF-8 and the Latin/Windows
+# code pages used on the web.
+_PREFILTER_RE = re.compile(rb"(?P<keyword>apero|aperitif)|(?P<link><a[\s>])", re.IGNORECASE)
+_KEYWORD_BYTES_RE = re.compile(rb"apero|aperitif", re.IGNORECASE)
+_UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+
+# Links to these file types are never followed.
+SKIPPED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif")
+
+# CSS classes that mark the location of an event, in order of preference.
+LOCATION_CLASSES = ("location", "venue")
+
+_LOCATION_TEXT_RE = re.compile(r"(?:Venue|Location)[:\-]\s*([A-Za-z0-9 ,.-]+)", re.IGNORECASE)
+
+
+@dataclass
+class ParsedPage:
+    """Information extracted from one HTML page."""
+
+    title: Optional[str] = None
+    links: list[str] = field(default_factory=list)
+    time_text: Optional[str] = None
+    location: Optional[str] = None
+    root: Optional[lxml.html.HtmlElement] = field(default=None, repr=False)
+
+    def text(self) -> str:
+        """Return the visible text of the page, fragments separated by ``|``."""
+        if self.root is None:
+            return ""
+        return "|".join(fragment.strip() for fragment in self.root.itertext() if fragment.strip())
+
+
+def prefilter(body: bytes, follow_links: bool = True) -> str:
+    """Decide from the raw bytes how much work a page needs.
+
+    Returns ``EXTRACT`` if the page mentions an apero, ``LINKS`` if it does
+    not but contains links that should be followed, and ``SKIP`` otherwise.
+    The body is scanned at most once and the scan stops at the first keyword.
+    """
+    if body.startswith(_UTF16_BOMS):
+        # Not ASCII-compatible; let the full pipeline handle it.
+        return EXTRACT
+    match = _PREFILTER_RE.search(body)
+    if match is None:
+        return SKIP
+    if match.lastgroup == "keyword":
+        return EXTRACT
+    # A link came first, the rest of the page only needs the keyword search.
+    if _KEYWORD_BYTES_RE.search(body, match.end()):
+        return EXTRACT
+    return LINKS if follow_links else SKIP
+
+
+def parse_html(html: str) -> Optional[lxml.html.HtmlElement]:
+    """Parse ``html`` into an lxml tree (``None`` for empty documents)."""
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration.
+        pass
+    except lxml.etree.ParserError:
+        return None
+    try:
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+    except lxml.etree.ParserError:
+        return None
+
+
+def parse_page(html: str, base_url: str, collect_links: bool = True) -> ParsedPage:
+    """Parse ``html`` once and collect title, links, time and location.
+
+    Parameters
+    ----------
+    html : str
+        Page source.
+    base_url : str
+        URL of the page, used to make links absolute.
+    collect_links : bool, default ``True``
+        Whether to collect the links of the page.
+    """
+    page = ParsedPage(root=parse_html(html))
+    if page.root is None:
+        return page
+
+    locations: dict[str, str] = {}
+    for element in page.root.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions.
+            continue
+        if tag == "a":
+            if collect_links:
+                href = element.get("href")
+                if href:
+                    absolute = urllib.parse.urljoin(base_url, href.strip())
+                    if not absolute.lower().endswith(SKIPPED_EXTENSIONS):
+                        page.links.append(absolute)
+        elif tag == "title":
+            if page.title is None and element.text:
+                page.title = element.text.strip()
+        elif tag == "time":
+            if page.time_text is None:
+                page.time_text = element.text_content().strip()
+
+        classes = element.get("class")
+        if classes:
+            for name in LOCATION_CLASSES:
+                if name not in locations and name in classes.split():
+                    locations[name] = element.text_content().strip()
+
+    for name in LOCATION_CLASSES:
+        if name in locations:
+            page.location = locations[name]
+            break
+    return page
+
+
+def find_location_in_text(text: str) -> Optional[str]:
+    """Search the page text for a ``Venue:``/``Location:`` label."""
+    match = _LOCATION_TEXT_RE.search(text)
+    return match.group(1).strip() if match else None
+
+
+def keyword_snippet(html: str, match: re.Match, context: int = 100) -> str:
+    """Return up to ``context`` characters around ``match`` on the same line."""
+    line_start = html.rfind("\n", 0, match.start()) + 1
+    line_end = html.find("\n", match.end())
+    if line_end == -1:
+        line_end = len(html)
+    return html[max(line_start, match.start() - context):min(line_end, match.end() + context)]
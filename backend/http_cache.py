@@ -0,0 +1,318 @@
+"""Persistent HTTP cache based on conditional requests.
+
+Responses that carry an ``ETag`` or ``Last-Modified`` header are stored on
+disk together with their validators.  The next request for the same URL
+replays them as ``If-None-Match``/``If-Modified-Since`` and, if the server
+answers ``304 Not Modified``, the body is served from the cache instead of
+being transferred again.
+
+The cache is shared by the AMIV API client and the web scraper.  Entries
+that have not been used for ``DEFAULT_MAX_AGE`` seconds, and the least
+recently used ones beyond ``DEFAULT_MAX_ENTRIES`` entries or
+``DEFAULT_MAX_SIZE`` bytes of bodies, are removed from time to time so that
+the cache does not grow without bound.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+from requests.structures import CaseInsensitiveDict
+
+from backend import http_client
+
+# Default location of the cache, next to the other crawl data.
+CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "http_cache"
+
+# Entries unused for longer than this (in seconds) are removed.
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+# Maximum number of cached URLs and total size of their bodies (in bytes).
+DEFAULT_MAX_ENTRIES = 20_000
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+# The cache is pruned on the first and then on every this many stored responses.
+PRUNE_INTERVAL = 500
+
+# Response headers kept alongside the cached body.
+STORED_HEADERS = ("content-type", "etag", "last-modified")
+
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+def detect_encoding(content_type: str, body: bytes) -> Optional[str]:
+    """Return the charset declared in ``content_type`` or in an HTML ``<meta>`` tag."""
+    match = _CHARSET_RE.search(content_type or "")
+    if match is None:
+        match = _META_CHARSET_RE.search(body[:2048])
+        if match is not None:
+            return match.group(1).decode("ascii")
+    return match.group(1) if match else None
+
+
+def content_type_matches(content_type: Optional[str], accepted: tuple[str, ...]) -> bool:
+    """Return whether the media type of ``content_type`` is one of ``accepted``.
+
+    Responses without a ``Content-Type`` header are accepted.
+    """
+    if not content_type:
+        return True
+    return content_type.split(";", 1)[0].strip().lower() in accepted
+
+
+class CachedResponse:
+    """Minimal response object returned when the body is served from disk
+    (or was read by a size-limited streaming request).
+
+    It mimics the parts of :class:`requests.Response` used by the fetchers:
+    ``status_code``, ``headers``, ``content``, ``text``, ``json()`` and
+    ``raise_for_status()``.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        content: bytes,
+        headers: Mapping[str, str],
+        encoding: Optional[str],
+        from_cache: bool = True,
+    ) -> None:
+        self.url = url
+        self.status_code = 200
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.encoding = encoding
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        try:
+            return self.content.decode(self.encoding or "utf-8", errors="replace")
+        except LookupError:
+            # Unknown charset name declared by the page.
+            return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        """Cached responses are always successful."""
+
+
+class HttpCache:
+    """On-disk store of response bodies keyed by URL.
+
+    Parameters
+    ----------
+    directory : Path, default ``CACHE_DIR``
+        Directory holding one ``<sha256>.json`` metadata file and one
+        ``<sha256>.body`` file per cached URL.
+    client : HttpClient, optional
+        Client used for the network requests.  Defaults to the shared
+        ``http_client.default_client``.
+    max_age : float, optional, default ``DEFAULT_MAX_AGE``
+        Seconds after which an unused entry is removed by ``prune``.
+    max_entries : int, optional, default ``DEFAULT_MAX_ENTRIES``
+        Number of entries kept by ``prune``, the most recently used first.
+    max_size : int, optional, default ``DEFAULT_MAX_SIZE``
+        Total size in bytes of the bodies kept by ``prune``, the most
+        recently used first.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CACHE_DIR,
+        client: Optional[http_client.HttpClient] = None,
+        max_age: Optional[float] = DEFAULT_MAX_AGE,
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        max_size: Optional[int] = DEFAULT_MAX_SIZE,
+    ) -> None:
+        self.directory = Path(directory)
+        self.client = client
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._stored = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def _load(self, url: str) -> Optional[dict[str, Any]]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with meta_path.open("r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["content"] = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        # Guard against (very unlikely) hash collisions, and against a body
+        # replaced by a concurrent writer after the metadata was read.
+        if meta.get("url") != url:
+            return None
+        digest = meta.get("digest")
+        if digest is not None and digest != hashlib.sha256(meta["content"]).hexdigest():
+            return None
+        return meta
+
+    def _store(self, url: str, response: Any) -> None:
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        meta = {
+            "url": url,
+            "encoding": response.encoding,
+            "headers": headers,
+            "digest": hashlib.sha256(response.content).hexdigest(),
+        }
+        meta_path, body_path = self._paths(url)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to temporary files first so that readers never see a
+            # partially written file.  Body and metadata are replaced one
+            # after the other; ``_load`` detects a body that does not match
+            # the metadata by its digest.
+            suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            body_tmp = body_path.with_name(body_path.name + suffix)
+            meta_tmp = meta_path.with_name(meta_path.name + suffix)
+            body_tmp.write_bytes(response.content)
+            with meta_tmp.open("w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(body_tmp, body_path)
+            os.replace(meta_tmp, meta_path)
+        except OSError as exc:  # pragma: no cover - best effort
+            print(f"Could not cache {url}: {exc}")
+            return
+        with self._lock:
+            due = self._stored % PRUNE_INTERVAL == 0
+            self._stored += 1
+        if due:
+            self.prune()
+
+    def _touch(self, url: str) -> None:
+        """Mark the entry of ``url`` as recently used."""
+        try:
+            os.utime(self._paths(url)[0])
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Remove expired entries and the least recently used ones over the limit.
+
+        Entries whose metadata was last written or used more than
+        ``max_age`` seconds ago are removed.  Of the others, the most
+        recently used ones are kept up to ``max_entries`` entries and
+        ``max_size`` bytes of bodies.  Returns the number of removed entries.
+        """
+        entries = []
+        try:
+            for meta_path in self.directory.glob("*.json"):
+                try:
+                    entries.append((meta_path.stat().st_mtime, meta_path))
+                except OSError:
+                    continue
+        except OSError:
+            return 0
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.max_age if self.max_age is not None else None
+        removed = 0
+        kept = 0
+        size = 0
+        full = False
+        for mtime, meta_path in entries:
+            body_path = meta_path.with_suffix(".body")
+            try:
+                body_size = body_path.stat().st_size
+            except OSError:
+                body_size = 0
+            full = full or (
+                (self.max_entries is not None and kept >= self.max_entries)
+                or (self.max_size is not None and size + body_size > self.max_size)
+            )
+            if not full and (cutoff is None or mtime >= cutoff):
+                kept += 1
+                size += body_size
+                continue
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:  # pragma: no cover - best effort
+                    print(f"Could not remove {path} from the cache: {exc}")
+            removed += 1
+        return removed
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        content_types: Optional[tuple[str, ...]] = None,
+    ) -> Any:
+        """Issue a conditional GET for ``url``.
+
+        Returns the live response when the server sends a new body (which is
+        cached if it carries validators) and a :class:`CachedResponse` when
+        the server answers ``304 Not Modified``.  Both expose ``from_cache``.
+
+        If ``max_bytes`` or ``content_types`` is given, the response is
+        streamed: a successful response whose media type is not in
+        ``content_types`` raises ``UnexpectedContentType`` before its body is
+        read, a body larger than ``max_bytes`` raises ``ResponseTooLarge``
+        as soon as the limit is exceeded, and an accepted body is returned as
+        a :class:`CachedResponse` with ``from_cache=False``.
+        """
+        request_headers = dict(headers or {})
+        cached = self._load(url)
+        if cached:
+            validators = cached.get("headers", {})
+            if "etag" in validators:
+                request_headers["If-None-Match"] = validators["etag"]
+            if "last-modified" in validators:
+                request_headers["If-Modified-Since"] = validators["last-modified"]
+
+        client = self.client or http_client.default_client
+        stream = max_bytes is not None or content_types is not None
+        response = client.get(url, headers=request_headers, timeout=timeout, stream=stream)
+
+        if response.status_code == 304 and cached:
+            response.close()
+            self._touch(url)
+            return CachedResponse(url, cached["content"], cached.get("headers", {}), cached.get("encoding"))
+
+        # Read before a streamed response is replaced by one that keeps
+        # only ``STORED_HEADERS``.
+        cache_control = response.headers.get("Cache-Control", "")
+        if stream:
+            if response.status_code != 200:
+                response.close()
+                return response
+            content_type = response.headers.get("Content-Type")
+            if content_types is not None and not content_type_matches(content_type, content_types):
+                response.close()
+                raise http_client.UnexpectedContentType(f"unexpected content type {content_type}")
+            body = client.read_body(response, max_bytes)
+            kept_headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+            response = CachedResponse(url, body, kept_headers, detect_encoding(content_type, body), from_cache=False)
+
+        response.from_cache = False
+        if (
+            response.status_code == 200
+            and "no-store" not in cache_control
+            and ("ETag" in response.headers or "Last-Modified" in response.headers)
+        ):
+            self._store(url, response)
+        return response
+
+
+# Cache instance shared by all fetchers.
+default_cache = HttpCache()
@@ -0,0 +1,219 @@
+"""Shared HTTP client used by all fetchers.
+
+A single :class:`HttpClient` keeps a pool of keep-alive connections per host
+so that consecutive requests to the same site reuse the TCP/TLS connection.
+If ``httpx`` (with its optional ``h2`` dependency) is installed, requests are
+sent over HTTP/2; otherwise a pooled :class:`requests.Session` is used.
+
+Transient failures (connection errors, timeouts and ``429``/``5xx``
+responses) are retried a bounded number of times with exponential backoff,
+honouring the ``Retry-After`` header when the server provides one.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:  # Optional dependency, only used for HTTP/2 support.
+    import httpx
+except ImportError:  # pragma: no cover - depends on the environment
+    httpx = None
+
+# Status codes that indicate a temporary problem on the server side.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Size of the chunks in which streamed bodies are read.
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(Exception):
+    """Raised when a response body exceeds the allowed size."""
+
+
+class UnexpectedContentType(Exception):
+    """Raised when a response has a content type the caller does not accept."""
+
+
+def _http2_available() -> bool:
+    """Return ``True`` if httpx and its HTTP/2 backend are installed."""
+    return httpx is not None and importlib.util.find_spec("h2") is not None
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    """Pooled HTTP client with keep-alive and retry/backoff.
+
+    Parameters
+    ----------
+    timeout : float, default ``10``
+        Default timeout in seconds for a single attempt.
+    pool_connections : int, default ``10``
+        Number of hosts for which connection pools are kept.
+    pool_maxsize : int, default ``20``
+        Maximum number of keep-alive connections per host.
+    max_retries : int, default ``3``
+        Number of retries after the first attempt for transient failures.
+    backoff_factor : float, default ``0.5``
+        The n-th retry waits ``backoff_factor * 2 ** n`` seconds unless the
+        server asks for a different delay via ``Retry-After``.
+    max_backoff : float, default ``60``
+        Upper bound for a single wait between two attempts.
+    http2 : bool, default ``True``
+        Use httpx with HTTP/2 when it is installed.
+    headers : mapping, optional
+        Headers sent with every request.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10,
+        pool_connections: int = 10,
+        pool_maxsize: int = 20,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 60,
+        http2: bool = True,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.http2 = http2 and _http2_available()
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                follow_redirects=True,
+                headers=dict(headers or {}),
+                limits=httpx.Limits(
+                    max_connections=pool_connections * pool_maxsize,
+                    max_keepalive_connections=pool_maxsize,
+                ),
+            )
+            self._transient_errors: tuple[type[BaseException], ...] = (httpx.TransportError,)
+        else:
+            session = requests.Session()
+            session.headers.update(headers or {})
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._client = session
+            self._transient_errors = (requests.ConnectionError, requests.Timeout)
+
+    def _backoff(self, attempt: int, response: Any = None) -> float:
+        delay = None
+        if response is not None:
+            delay = _retry_after_seconds(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = self.backoff_factor * (2 ** attempt)
+        return min(delay, self.max_backoff)
+
+    def _send(self, url: str, headers: Optional[Mapping[str, str]], timeout: float, stream: bool) -> Any:
+        if not self.http2:
+            return self._client.get(url, headers=headers, timeout=timeout, stream=stream)
+        request = self._client.build_request("GET", url, headers=headers, timeout=timeout)
+        return self._client.send(request, stream=stream)
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+    ) -> Any:
+        """Send a GET request, retrying transient failures.
+
+        Returns the final response, which may still carry an error status if
+        all retries are exhausted; callers decide whether to
+        ``raise_for_status()``.  Connection errors are re-raised after the
+        last attempt.  With ``stream=True`` only the headers are read; use
+        ``read_body`` to read the body.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        attempt = 0
+        while True:
+            try:
+                response = self._send(url, headers, timeout, stream)
+            except self._transient_errors:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                time.sleep(self._backoff(attempt, response))
+                response.close()
+            attempt += 1
+
+    def read_body(self, response: Any, max_bytes: Optional[int] = None) -> bytes:
+        """Read the body of a streamed ``response``, at most ``max_bytes``.
+
+        Raises :class:`ResponseTooLarge` (and closes the response) as soon as
+        the announced ``Content-Length`` or the data read so far exceeds the
+        limit, so oversized bodies are never downloaded completely.
+        """
+        try:
+            if max_bytes is not None:
+                length = response.headers.get("Content-Length")
+                if length and length.isdigit() and int(length) > max_bytes:
+                    raise ResponseTooLarge(f"{length} bytes announced, limit is {max_bytes}")
+            if self.http2:
+                chunks = response.iter_bytes(CHUNK_SIZE)
+            else:
+                chunks = response.iter_content(CHUNK_SIZE)
+            body = bytearray()
+            for chunk in chunks:
+                body += chunk
+                if max_bytes is not None and len(body) > max_bytes:
+                    raise ResponseTooLarge(f"body exceeds the limit of {max_bytes} bytes")
+            return bytes(body)
+        finally:
+            response.close()
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self._client.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+# Client instance shared by all fetchers.  Use ``configure_default_client``
+# to change its settings (e.g. in scripts or tests).
+default_client = HttpClient()
+
+
+def configure_default_client(**options: Any) -> HttpClient:
+    """Replace the shared client by one created with ``options``."""
+    global default_client
+    old_client = default_client
+    default_client = HttpClient(**options)
+    old_client.close()
+    return default_client
@@ -0,0 +1,80 @@
+"""Multi-keyword substring search based on the Aho-Corasick algorithm.
+
+The matcher is built once from a collection of keywords and afterwards finds
+every keyword occurring in a text in a single left-to-right pass, regardless
+of how many keywords there are.  Overlapping matches are reported as well, so
+the result is identical to testing ``keyword in text`` for each keyword.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Hashable, Iterable, Tuple
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    Parameters
+    ----------
+    keywords : iterable of ``(keyword, payload)`` tuples
+        Every keyword is associated with a hashable payload which is returned
+        when the keyword is found.  The same keyword may carry several
+        payloads and empty keywords are ignored.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]]) -> None:
+        # State 0 is the root.  ``_goto[state]`` maps a character to the next
+        # state, ``_fail[state]`` is the longest proper suffix state and
+        # ``_output[state]`` holds the payloads of all keywords ending there.
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[frozenset] = [frozenset()]
+
+        outputs: list[set] = [set()]
+        for keyword, payload in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append(set())
+                state = next_state
+            outputs[state].add(payload)
+
+        # Breadth-first construction of the failure links.  The outputs of the
+        # failure state are merged in so that the search loop never has to
+        # follow the failure chain to report matches.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                outputs[next_state] |= outputs[self._fail[next_state]]
+
+        self._output = [frozenset(payloads) for payloads in outputs]
+
+    def find(self, text: str) -> set[Any]:
+        """Return the payloads of all keywords that occur in ``text``."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found: set[Any] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
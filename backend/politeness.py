@@ -0,0 +1,172 @@
+"""Per-host politeness scheduling for the crawler.
+
+Every host gets its own token bucket which refills at a configurable rate
+and allows short bursts.  A fetch is released as soon as its host has a
+token available, so several sites can be crawled in parallel while each one
+individually stays within its limit.  ``acquire`` waits for the token;
+``try_acquire`` never waits, so that a crawler can turn to another host
+instead of blocking a worker on a busy one.
+
+If a site's ``robots.txt`` specifies a ``Crawl-delay`` (or ``Request-rate``)
+that is stricter than the configured rate, the site's value is used, and
+URLs disallowed by ``robots.txt`` are reported as not fetchable.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import urllib.parse
+import urllib.robotparser
+from typing import Mapping, Optional
+
+from backend.http_cache import default_cache
+
+# Default request rate per host (requests per second) and burst size.
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 1
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second.
+    burst : int
+        Maximum number of tokens the bucket can hold.
+
+    ``reserve`` always takes a token, possibly driving the balance negative,
+    and returns how long the caller has to wait until its token is actually
+    available.  Concurrent callers therefore queue up in order without
+    having to poll.  ``take`` only takes a token that is available now.
+    """
+
+    def __init__(self, rate: float, burst: int, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Take a token and return the delay in seconds before it may be used."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now: float) -> float:
+        """Take a token if one is available (returns ``0``).
+
+        Otherwise no token is taken and the delay in seconds until the next
+        one becomes available is returned.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class HostScheduler:
+    """Release fetches per host according to a token bucket.
+
+    Parameters
+    ----------
+    rate : float, default ``DEFAULT_RATE``
+        Requests per second allowed per host.
+    burst : int, default ``DEFAULT_BURST``
+        Number of requests a host may receive back to back.
+    user_agent : str, default ``"*"``
+        Name matched against the ``User-agent`` lines of ``robots.txt``.
+    headers : mapping, optional
+        Headers used when fetching ``robots.txt``.
+    respect_robots : bool, default ``True``
+        Fetch ``robots.txt`` per host to honour ``Crawl-delay`` and
+        ``Disallow`` rules.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        user_agent: str = "*",
+        headers: Optional[Mapping[str, str]] = None,
+        respect_robots: bool = True,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.user_agent = user_agent
+        self.headers = dict(headers or {})
+        self.respect_robots = respect_robots
+        self._buckets: dict[str, TokenBucket] = {}
+        self._robots: dict[str, urllib.robotparser.RobotFileParser] = {}
+        self._robots_locks: dict[str, asyncio.Lock] = {}
+
+    def _load_robots(self, origin: str) -> urllib.robotparser.RobotFileParser:
+        parser = urllib.robotparser.RobotFileParser(origin + "/robots.txt")
+        lines: list[str] = []
+        try:
+            resp = default_cache.get(parser.url, headers=self.headers, timeout=10)
+            if resp.status_code == 200:
+                lines = resp.text.splitlines()
+        except Exception as exc:  # pragma: no cover - best effort
+            print(f"Could not fetch {parser.url}: {exc}")
+        # A missing or unreachable robots.txt allows everything.
+        parser.parse(lines)
+        return parser
+
+    async def _robots_for(self, url: str) -> Optional[urllib.robotparser.RobotFileParser]:
+        if not self.respect_robots:
+            return None
+        parts = urllib.parse.urlparse(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in self._robots:
+            lock = self._robots_locks.setdefault(origin, asyncio.Lock())
+            async with lock:
+                if origin not in self._robots:
+                    self._robots[origin] = await asyncio.to_thread(self._load_robots, origin)
+        return self._robots[origin]
+
+    def _host_rate(self, robots: Optional[urllib.robotparser.RobotFileParser]) -> float:
+        rate = self.rate
+        if robots is None:
+            return rate
+        delay = robots.crawl_delay(self.user_agent)
+        if delay:
+            rate = min(rate, 1.0 / float(delay))
+        request_rate = robots.request_rate(self.user_agent)
+        if request_rate and request_rate.seconds:
+            rate = min(rate, request_rate.requests / request_rate.seconds)
+        return rate
+
+    async def allowed(self, url: str) -> bool:
+        """Return whether ``robots.txt`` allows fetching ``url``."""
+        robots = await self._robots_for(url)
+        return robots is None or robots.can_fetch(self.user_agent, url)
+
+    async def _bucket(self, url: str) -> TokenBucket:
+        robots = await self._robots_for(url)
+        host = urllib.parse.urlparse(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self._host_rate(robots), self.burst, asyncio.get_running_loop().time())
+            self._buckets[host] = bucket
+        return bucket
+
+    async def acquire(self, url: str) -> None:
+        """Wait until the host of ``url`` may receive the next request."""
+        bucket = await self._bucket(url)
+        await asyncio.sleep(bucket.reserve(asyncio.get_running_loop().time()))
+
+    async def try_acquire(self, url: str) -> float:
+        """Claim a request to the host of ``url`` without waiting.
+
+        Returns ``0`` if the request may be sent now, otherwise the number of
+        seconds until the host's next token (which is not claimed).
+        """
+        bucket = await self._bucket(url)
+        return bucket.take(asyncio.get_running_loop().time())
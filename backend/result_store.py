@@ -0,0 +1,131 @@
+"""Append-only store for crawl results.
+
+Every record is written as one JSON object per line (JSON Lines), so adding
+a result costs a single append instead of rewriting the whole file.  The
+store can optionally be compressed; the compression is chosen from the file
+suffix:
+
+* ``.jsonl``      plain text,
+* ``.jsonl.gz``   gzip (standard library),
+* ``.jsonl.zst``  zstandard (requires the optional ``zstandard`` package).
+
+Compressed files are written as a sequence of independent frames, which both
+formats allow, so a store can be re-opened and extended later.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+try:  # Optional dependency, only needed for ``.zst`` stores.
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+PathLike = Union[str, Path]
+
+
+def _compression_for(path: Path) -> Optional[str]:
+    if path.suffix == ".gz":
+        return "gzip"
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("The 'zstandard' package is required for .zst result stores.")
+        return "zstd"
+    return None
+
+
+class ResultStore:
+    """JSON Lines file that records are appended to one at a time.
+
+    Parameters
+    ----------
+    path : str or Path
+        Location of the store.  The compression is derived from the suffix.
+
+    The store is a context manager; while it is open, the underlying file
+    handle is kept so that appends do not reopen the file.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        self.compression = _compression_for(self.path)
+        self._raw: Optional[io.BufferedIOBase] = None
+        self._writer: Optional[io.TextIOBase] = None
+
+    def open(self) -> "ResultStore":
+        """Open the store for appending (creates the file if necessary)."""
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.compression == "gzip":
+                binary = gzip.open(self.path, "ab")
+            elif self.compression == "zstd":
+                self._raw = self.path.open("ab")
+                binary = zstandard.ZstdCompressor().stream_writer(self._raw)
+            else:
+                binary = self.path.open("ab")
+            self._writer = io.TextIOWrapper(binary, encoding="utf-8", newline="\n")
+        return self
+
+    def close(self) -> None:
+        """Flush and close the store."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+    def __enter__(self) -> "ResultStore":
+        return self.open()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def append(self, record: Any) -> None:
+        """Append ``record`` as a single JSON line."""
+        self.open()
+        self._writer.write(json.dumps(record, ensure_ascii=False))
+        self._writer.write("\n")
+
+    def clear(self) -> None:
+        """Remove all records by deleting the file."""
+        self.close()
+        if self.path.exists():
+            os.remove(self.path)
+
+    def _open_for_reading(self) -> io.TextIOBase:
+        if self.compression == "gzip":
+            binary = gzip.open(self.path, "rb")
+        elif self.compression == "zstd":
+            binary = zstandard.ZstdDecompressor().stream_reader(self.path.open("rb"), read_across_frames=True, closefd=True)
+        else:
+            binary = self.path.open("rb")
+        return io.TextIOWrapper(binary, encoding="utf-8")
+
+    def __iter__(self) -> Iterator[Any]:
+        """Stream the records back in the order they were appended.
+
+        A truncated final record, as left behind by an interrupted crawl, is
+        skipped.
+        """
+        if not self.path.exists():
+            return
+        with self._open_for_reading() as f:
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        if line.endswith("\n"):
+                            raise
+                        return
+            except EOFError:
+                return
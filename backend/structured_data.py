@@ -0,0 +1,154 @@
+"""Extraction of schema.org ``Event`` data published as JSON-LD or microdata.
+
+Many event pages describe their events in machine readable form.  When such
+data is present, date, times and location can be taken from it directly
+instead of being guessed from the page text.  ``extruct`` is used when it is
+installed; without it only JSON-LD is read.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Iterator, Optional
+
+import lxml.html
+
+try:  # Optional dependency, also needed for microdata.
+    from extruct.jsonld import JsonLdExtractor
+    from extruct.w3cmicrodata import MicrodataExtractor
+except ImportError:  # pragma: no cover - depends on the environment
+    JsonLdExtractor = None
+    MicrodataExtractor = None
+
+# Cheap markers that tell whether a page contains structured data at all.
+_MARKERS = ("application/ld+json", "itemtype")
+
+_DATETIME_RE = re.compile(r"(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}))?")
+
+
+def _types(item: dict[str, Any]) -> list[str]:
+    types = item.get("@type", [])
+    if isinstance(types, str):
+        types = [types]
+    # Types may be given as full URLs, e.g. "https://schema.org/Event".
+    return [str(name).rstrip("/").rsplit("/", 1)[-1] for name in types]
+
+
+def _from_microdata(item: Any) -> Any:
+    """Convert extruct's microdata layout into the JSON-LD layout."""
+    if isinstance(item, list):
+        return [_from_microdata(value) for value in item]
+    if not isinstance(item, dict) or "properties" not in item:
+        return item
+    converted = {key: _from_microdata(value) for key, value in item["properties"].items()}
+    converted["@type"] = item.get("type", [])
+    return converted
+
+
+def _walk(item: Any) -> Iterator[dict[str, Any]]:
+    """Yield every object in a (nested) JSON-LD structure."""
+    if isinstance(item, list):
+        for value in item:
+            yield from _walk(value)
+    elif isinstance(item, dict):
+        yield item
+        for value in item.values():
+            if isinstance(value, (dict, list)):
+                yield from _walk(value)
+
+
+def _json_ld_items(root: lxml.html.HtmlElement, base_url: str) -> Iterator[Any]:
+    if JsonLdExtractor is not None:
+        yield from JsonLdExtractor().extract_items(root)
+        return
+    for script in root.xpath('//script[@type="application/ld+json"]'):
+        try:
+            yield json.loads(script.text_content())
+        except ValueError:
+            continue
+
+
+def _microdata_items(root: lxml.html.HtmlElement, base_url: str) -> Iterator[Any]:
+    if MicrodataExtractor is None:
+        return
+    for item in MicrodataExtractor().extract_items(root, base_url):
+        yield _from_microdata(item)
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    return str(value).strip() if value is not None else ""
+
+
+def _format_location(location: Any) -> Optional[str]:
+    """Turn a ``Place``/``PostalAddress`` (or plain string) into one line."""
+    if isinstance(location, list):
+        location = location[0] if location else None
+    if not location:
+        return None
+    if not isinstance(location, dict):
+        return _text(location) or None
+    parts = [_text(location.get("name"))]
+    address = location.get("address")
+    if isinstance(address, dict):
+        parts += [
+            _text(address.get(key))
+            for key in ("streetAddress", "postalCode", "addressLocality")
+        ]
+    elif address:
+        parts.append(_text(address))
+    parts = [part for part in parts if part]
+    # Avoid "HG, HG" when the name repeats the address.
+    return ", ".join(dict.fromkeys(parts)) or None
+
+
+def find_structured_event(root: Optional[lxml.html.HtmlElement], html: str, base_url: str) -> Optional[dict[str, Optional[str]]]:
+    """Return date, times and location of the first schema.org ``Event``.
+
+    Parameters
+    ----------
+    root : lxml element or None
+        Parsed page, as produced by ``html_parsing.parse_page``.
+    html : str
+        Page source, only used for a quick check whether any structured
+        data is present.
+    base_url : str
+        URL of the page.
+
+    Returns
+    -------
+    dict or None
+        ``date`` (``YYYY-MM-DD``), ``start_time``/``end_time`` (``hh:mm``)
+        and ``location``; individual values are ``None`` if the event does
+        not provide them.  ``None`` if the page describes no event.
+    """
+    if root is None or not any(marker in html for marker in _MARKERS):
+        return None
+
+    def items() -> Iterator[Any]:
+        # Broken markup is common; it must not stop the heuristics.
+        for extract in (_json_ld_items, _microdata_items):
+            try:
+                found = list(extract(root, base_url))
+            except Exception as exc:
+                print(f"Ignoring invalid structured data on {base_url}: {exc}")
+                continue
+            yield from found
+
+    for item in items():
+        for candidate in _walk(item):
+            if not any(name.endswith("Event") for name in _types(candidate)):
+                continue
+            start = _DATETIME_RE.search(_text(candidate.get("startDate")))
+            end = _DATETIME_RE.search(_text(candidate.get("endDate")))
+            if start is None:
+                continue
+            return {
+                "date": start.group(1),
+                "start_time": start.group(2),
+                "end_time": end.group(2) if end else None,
+                "location": _format_location(candidate.get("location")),
+            }
+    return None
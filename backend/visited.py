@@ -0,0 +1,189 @@
+"""URL canonicalisation and a compact, memory-mapped visited-URL index.
+
+``canonicalize_url`` maps near-duplicate URLs (fragments, trailing slashes,
+tracking parameters, query parameter order, default ports, host case) to a
+single form so that they are only fetched once.
+
+:class:`VisitedIndex` stores a 64-bit fingerprint of every canonical URL in
+an open-addressing hash table inside a memory-mapped file.  Opening the index
+does not parse anything, so startup cost is constant regardless of how many
+URLs have been visited, and each lookup touches a handful of slots.
+Fingerprints can in principle collide; with 64 bits this is negligible for
+the number of pages a crawl visits.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import urllib.parse
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+# Query parameters that only track the visitor and never change the content.
+TRACKING_PARAMS = frozenset({
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_hsenc",
+    "_hsmi",
+})
+TRACKING_PREFIXES = ("utm_",)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_MAGIC = b"APVISIT1"
+_HEADER = struct.Struct("<8sQ")  # magic, number of stored fingerprints
+_SLOT = struct.Struct("<Q")
+_INITIAL_CAPACITY = 1024
+# The table is doubled once it is more than half full.
+_MAX_LOAD = 0.5
+
+
+def canonicalize_url(url: str) -> str:
+    """Return the canonical form of ``url`` used for de-duplication."""
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    netloc = host
+    if parts.username or parts.password:
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{port}"
+
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    query = sorted(
+        (key, value)
+        for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urllib.parse.urlunsplit((scheme, netloc, path, urllib.parse.urlencode(query), ""))
+
+
+def url_fingerprint(url: str) -> int:
+    """Return the non-zero 64-bit fingerprint of the canonical form of ``url``."""
+    digest = hashlib.blake2b(canonicalize_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class VisitedIndex:
+    """Set of visited URLs stored as fingerprints in a memory-mapped file.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Backing file; created if it does not exist.  Without a path the index
+        lives in memory only.
+
+    Supports the subset of the ``set`` interface used by the crawler:
+    ``in``, ``add``, ``update`` and ``len``.  URLs are canonicalised before
+    they are stored or looked up.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None) -> None:
+        self.path = Path(path) if path is not None else None
+        self._file = None
+        self._map: Union[mmap.mmap, bytearray, None] = None
+        if self.path is not None and self.path.exists() and self.path.stat().st_size > _HEADER.size:
+            self._open_file()
+        else:
+            self._create(_INITIAL_CAPACITY, [])
+
+    # -- storage -----------------------------------------------------------
+
+    def _open_file(self) -> None:
+        self._file = self.path.open("r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not a visited-URL index")
+        self._capacity = (len(self._map) - _HEADER.size) // _SLOT.size
+
+    def _create(self, capacity: int, fingerprints: Iterable[int]) -> None:
+        """(Re)build the table with ``capacity`` slots holding ``fingerprints``."""
+        table = bytearray(_HEADER.size + capacity * _SLOT.size)
+        count = 0
+        for fingerprint in fingerprints:
+            slot = fingerprint % capacity
+            while _SLOT.unpack_from(table, _HEADER.size + slot * _SLOT.size)[0]:
+                slot = (slot + 1) % capacity
+            _SLOT.pack_into(table, _HEADER.size + slot * _SLOT.size, fingerprint)
+            count += 1
+        _HEADER.pack_into(table, 0, _MAGIC, count)
+
+        self.close()
+        if self.path is None:
+            self._map = table
+            self._capacity = capacity
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_bytes(table)
+        os.replace(tmp, self.path)
+        self._open_file()
+
+    def _fingerprints(self) -> Iterable[int]:
+        for offset in range(_HEADER.size, len(self._map), _SLOT.size):
+            (fingerprint,) = _SLOT.unpack_from(self._map, offset)
+            if fingerprint:
+                yield fingerprint
+
+    def _find(self, fingerprint: int) -> tuple[bool, int]:
+        """Return whether ``fingerprint`` is stored and its (or the free) slot offset."""
+        slot = fingerprint % self._capacity
+        while True:
+            offset = _HEADER.size + slot * _SLOT.size
+            (stored,) = _SLOT.unpack_from(self._map, offset)
+            if stored == fingerprint:
+                return True, offset
+            if not stored:
+                return False, offset
+            slot = (slot + 1) % self._capacity
+
+    # -- set interface -----------------------------------------------------
+
+    def __len__(self) -> int:
+        return _HEADER.unpack_from(self._map, 0)[1]
+
+    def __contains__(self, url: object) -> bool:
+        return isinstance(url, str) and self._find(url_fingerprint(url))[0]
+
+    def add(self, url: str) -> None:
+        fingerprint = url_fingerprint(url)
+        found, offset = self._find(fingerprint)
+        if found:
+            return
+        count = len(self) + 1
+        if count > self._capacity * _MAX_LOAD:
+            self._create(self._capacity * 2, [*self._fingerprints(), fingerprint])
+            return
+        _SLOT.pack_into(self._map, offset, fingerprint)
+        _HEADER.pack_into(self._map, 0, _MAGIC, count)
+
+    def update(self, urls: Iterable[str]) -> None:
+        for url in urls:
+            self.add(url)
+
+    def flush(self) -> None:
+        """Write pending changes of a file-backed index to disk."""
+        if isinstance(self._map, mmap.mmap):
+            self._map.flush()
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.flush()
+            self._map.close()
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
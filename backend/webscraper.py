@@ -5,31 +5,80 @@ word 'apero' (or 'aperitif') in the HTML content. When a match is
 found, it attempts to extract event details such as date, time and
 location. Results are stored in ``apero_results.json``.
 
-The crawler keeps a record of already visited URLs in
-``visited_urls.json`` so that subsequent runs only fetch new pages.
+Pages are crawled breadth-first from an asyncio frontier by a bounded pool
+of workers.  A token bucket per host (see ``backend.politeness``) keeps each
+site within its request rate.  Workers only take URLs of hosts that may
+receive a request right away, so several sites are crawled in parallel.
+
+The crawler keeps a compact index of already visited (canonicalised) URLs
+in ``visited_urls.idx`` so that subsequent runs only fetch new pages.  While a
+crawl is running, its frontier is checkpointed in ``crawl_frontier.sqlite3``
+so that an interrupted crawl resumes where it stopped.
+
+With ``--discover`` the crawler does not follow links blindly.  It fetches
+only the event-detail pages announced by the sites' sitemaps and event
+listing pages (see ``backend.discovery``), skipping pages whose sitemap
+``lastmod`` is unchanged since the last crawl.
 """
 
 from __future__ import annotations
 
+import argparse
+import asyncio
 import json
 import re
-import time
 from pathlib import Path
-from typing import Iterable, Set, Tuple
+from typing import Iterable, Optional, Tuple
 
-import requests
-from bs4 import BeautifulSoup
 import urllib.parse
 
+from backend.amiv_api import upsert_events
+from backend.discovery import discover_event_urls, load_lastmod_state, save_lastmod_state
+from backend.event_store import EventStore
+from backend.frontier import CrawlFrontier
+from backend.html_parsing import (
+    EXTRACT,
+    KEYWORD_RE,
+    LINK_RE,
+    SKIP,
+    ParsedPage,
+    find_location_in_text,
+    keyword_snippet,
+    parse_page,
+    prefilter,
+)
+from backend.http_cache import default_cache
+from backend.http_client import ResponseTooLarge, UnexpectedContentType
+from backend.politeness import HostScheduler
+from backend.structured_data import find_structured_event
+from backend.visited import VisitedIndex, canonicalize_url
+
 # List of websites to crawl for apero events. Feel free to extend this.
 URLS: Iterable[str] = [
     "https://vseth.ethz.ch/events/",
 ]
 
+# Event listing pages that link to the individual events (discovery mode).
+LISTING_URLS: Iterable[str] = URLS
+
 # Files used to persist crawl results/state.
 DATA_DIR = Path(__file__).resolve().parent
-VISITED_FILE = DATA_DIR / "visited_urls.json"
+VISITED_FILE = DATA_DIR / "visited_urls.idx"
+LEGACY_VISITED_FILE = DATA_DIR / "visited_urls.json"
 OUTPUT_FILE = DATA_DIR / "apero_results.json"
+FRONTIER_FILE = DATA_DIR / "crawl_frontier.sqlite3"
+LASTMOD_FILE = DATA_DIR / "sitemap_lastmod.json"
+
+# Number of pages fetched concurrently.
+DEFAULT_WORKERS = 8
+
+# Only HTML responses up to this size (in bytes) are downloaded.
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+# Requests per second and burst size allowed per host.
+HOST_RATE = 1.0
+HOST_BURST = 1
 
 # Use a custom user agent to be polite when requesting pages.
 HEADERS = {
@@ -39,147 +88,371 @@ HEADERS = {
 # Storage for discovered apero events during a crawl session.
 found_apero: list[dict[str, str]] = []
 
-def load_visited(filename: Path) -> Set[str]:
-    """Return a set of URLs previously visited.
+def load_visited(filename: Path, legacy_file: Optional[Path] = LEGACY_VISITED_FILE) -> VisitedIndex:
+    """Open the index of previously visited URLs.
 
     Parameters
     ----------
     filename : Path
-        JSON file containing a list of URLs.
+        Memory-mapped visited-URL index (created if missing).
+    legacy_file : Path, optional
+        JSON list of URLs written by earlier versions of the crawler.  It is
+        imported once into a new, empty index.
     """
-    try:
-        with filename.open("r", encoding="utf-8") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        # No state yet; start fresh.
-        return set()
-    except Exception as exc:  # pragma: no cover - best effort
-        print(f"Could not load visited URLs from {filename}: {exc}")
-        return set()
+    visited = VisitedIndex(filename)
+    if not len(visited) and legacy_file is not None and legacy_file.exists():
+        try:
+            with legacy_file.open("r", encoding="utf-8") as f:
+                visited.update(json.load(f))
+        except Exception as exc:  # pragma: no cover - best effort
+            print(f"Could not import visited URLs from {legacy_file}: {exc}")
+    return visited
 
-def save_visited(filename: Path, visited: Set[str]) -> None:
-    """Persist the set of visited URLs as a JSON list."""
+def save_visited(visited: VisitedIndex) -> None:
+    """Persist the visited-URL index."""
     try:
-        with filename.open("w", encoding="utf-8") as f:
-            json.dump(sorted(visited), f, indent=2)
+        visited.flush()
     except Exception as exc:  # pragma: no cover - best effort
-        print(f"Could not save visited URLs to {filename}: {exc}")
+        print(f"Could not save visited URLs to {visited.path}: {exc}")
 
-def extract_event_details(soup: BeautifulSoup) -> Tuple[str, str, str, str]:
+def extract_event_details(page: ParsedPage, html: str = "", url: str = "") -> Tuple[str, str, str, str]:
     """Extract event date, start time, end time and location from the page.
 
-    The logic is heuristic: it first looks for ``<time>`` elements, then
-    for classes such as ``location`` or ``venue``. If those are missing it
-    scans the entire text for common keywords.
+    Schema.org ``Event`` data (JSON-LD or microdata) is used when the page
+    provides it.  Fields it does not cover are found heuristically: first
+    via ``<time>`` elements, then via classes such as ``location`` or
+    ``venue``.  Only if those are missing the entire text is scanned for
+    common keywords.
     """
     date = "Not found"
     start_time = "Not found"
     end_time = "Not found"
     location = "Not found"
 
-    full_text = soup.get_text("|", strip=True)
+    event = find_structured_event(page.root, html, url) or {}
+    date = event.get("date") or date
+    start_time = event.get("start_time") or start_time
+    end_time = event.get("end_time") or end_time
+    location = event.get("location") or location
 
     # Look for ISO-style or textual date/time information in <time> tags.
-    time_el = soup.find("time")
-    if time_el:
-        text = time_el.get_text(strip=True)
-        date_match = re.search(r"(\d{4}-\d{2}-\d{2})", text)
-        time_match = re.search(r"(\d{1,2}:\d{2})", text)
-        if date_match:
+    if page.time_text is not None:
+        date_match = re.search(r"(\d{4}-\d{2}-\d{2})", page.time_text)
+        time_match = re.search(r"(\d{1,2}:\d{2})", page.time_text)
+        if date_match and date == "Not found":
             date = date_match.group(1)
-        if time_match:
+        if time_match and start_time == "Not found":
             start_time = time_match.group(1)
 
-    # Attempt to find location via common classes.
-    loc_el = soup.find(class_="location") or soup.find(class_="venue")
-    if loc_el:
-        location = loc_el.get_text(strip=True)
-    else:
-        loc_match = re.search(r"(?:Venue|Location)[:\-]\s*([A-Za-z0-9 ,.-]+)", full_text, re.IGNORECASE)
-        if loc_match:
-            location = loc_match.group(1).strip()
+    # Attempt to find location via common classes, falling back to the text.
+    if location == "Not found":
+        if page.location is not None:
+            location = page.location
+        else:
+            location = find_location_in_text(page.text()) or location
 
     return date, start_time, end_time, location
 
-def crawl(url: str, domain: str, visited: Set[str], depth: int = 0, max_depth: int = 3) -> None:
-    """Recursively crawl ``url`` and its subpages.
+def process_page(
+    url: str,
+    html: str,
+    follow_links: bool = True,
+    extract: bool = True,
+) -> Tuple[Optional[dict[str, str]], list[str]]:
+    """Search ``html`` for apero mentions and collect the links on the page.
 
-    Parameters
-    ----------
-    url : str
-        The starting URL.
-    domain : str
-        Domain that links must match to be followed. This prevents the
-        crawler from wandering off to other sites.
-    visited : set[str]
-        Set of URLs already fetched.
-    depth : int, default ``0``
-        Current recursion depth.
-    max_depth : int, default ``3``
-        Maximum recursion depth allowed.
+    Returns the apero record for the page (or ``None`` if it does not
+    mention an apero) and the links found on it (only if ``follow_links``).
+    The links are absolute and exclude common binary file types; filtering
+    by domain is left to the caller.  With ``extract=False`` the page is
+    known not to mention an apero (see ``prefilter``) and only the links are
+    collected.
+
+    The page is parsed at most once.  Pages without an apero mention are
+    not parsed at all when there are no links to collect.
     """
-    if url in visited:
-        return
-    visited.add(url)
+    # Look for 'apero' or 'aperitif' case-insensitively.
+    keyword_match = KEYWORD_RE.search(html) if extract else None
+    follow_links = follow_links and LINK_RE.search(html) is not None
+    if keyword_match is None and not follow_links:
+        return None, []
+
+    page = parse_page(html, url, collect_links=follow_links)
 
+    record = None
+    if keyword_match is not None:
+        date, start_t, end_t, location = extract_event_details(page, html, url)
+        record = {
+            "url": url,
+            "title": page.title or "No title",
+            "snippet": keyword_snippet(html, keyword_match),
+            "date": date,
+            "start_time": start_t,
+            "end_time": end_t,
+            "location": location,
+        }
+        print(f"Found 'apero' in: {url}")
+
+    return record, page.links
+
+def fetch_and_process(url: str, follow_links: bool = True) -> Tuple[str, Optional[dict[str, str]], list[str]]:
+    """Fetch ``url`` and process it.
+
+    Returns the fetch state for the frontier (``"done"``, ``"skipped"`` for
+    non-HTML or oversized responses, or ``"failed"``), the apero record of
+    the page (if any) and its links.
+    """
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+        # Stream the body so that non-HTML and oversized responses are
+        # rejected before (or while) they are downloaded.
+        resp = default_cache.get(
+            url,
+            headers=HEADERS,
+            timeout=10,
+            max_bytes=MAX_BODY_BYTES,
+            content_types=HTML_CONTENT_TYPES,
+        )
+    except (UnexpectedContentType, ResponseTooLarge) as exc:
+        print(f"Skipping {url}: {exc}")
+        return "skipped", None, []
     except Exception as exc:
         print(f"Error fetching {url}: {exc}")
-        return
+        return "failed", None, []
 
     if resp.status_code != 200:
         print(f"Skipping {url} due to status code {resp.status_code}")
-        return
+        return "failed", None, []
 
-    html = resp.text
-    soup = BeautifulSoup(html, "html.parser")
-    title = soup.title.string.strip() if soup.title and soup.title.string else "No title"
+    # Decide on the raw bytes whether the page is worth decoding and parsing.
+    action = prefilter(resp.content, follow_links)
+    if action == SKIP:
+        return "done", None, []
 
-    # Look for 'apero' or 'aperitif' case-insensitively.
-    if re.search(r"apero|aperitif", html, re.IGNORECASE):
-        date, start_t, end_t, location = extract_event_details(soup)
-        snippet_match = re.search(r".{0,100}(apero|aperitif).{0,100}", html, re.IGNORECASE)
-        snippet = snippet_match.group(0) if snippet_match else "Snippet not available"
-        found_apero.append({
-            "url": url,
-            "title": title,
-            "snippet": snippet,
-            "date": date,
-            "start_time": start_t,
-            "end_time": end_t,
-            "location": location,
-        })
-        print(f"Found 'apero' in: {url}")
+    record, links = process_page(url, resp.text, follow_links, extract=action == EXTRACT)
+    return "done", record, links
+
+def _domain(url: str) -> str:
+    """Return the normalised host (and non-default port) of ``url``."""
+    return urllib.parse.urlparse(canonicalize_url(url)).netloc
+
+async def crawl_async(
+    start_urls: Iterable[str],
+    visited: VisitedIndex,
+    max_depth: int = 3,
+    workers: int = DEFAULT_WORKERS,
+    scheduler: Optional[HostScheduler] = None,
+    frontier: Optional[CrawlFrontier] = None,
+) -> None:
+    """Crawl ``start_urls`` and their subpages breadth-first.
+
+    The frontier hands out the shallowest queued URL first to ``workers``
+    concurrent tasks.  Links are only followed within the domain of the
+    start URL they were found from.  URLs of hosts that have to wait for
+    the per-host ``scheduler`` are passed over until their host's token
+    bucket allows the next request; in the meantime the workers fetch from
+    other hosts, so the crawl takes about as long as its busiest host needs.
+    Workers only sleep if no host is ready.  Apero records are appended to
+    ``found_apero``.
+
+    Parameters
+    ----------
+    start_urls : iterable of str
+        URLs to start from.  Each one defines the domain for its subpages.
+    visited : VisitedIndex
+        URLs already fetched; updated in place.
+    max_depth : int, default ``3``
+        Maximum link depth relative to the start URLs.
+    workers : int, default ``DEFAULT_WORKERS``
+        Number of pages fetched and processed concurrently.
+    scheduler : HostScheduler, optional
+        Politeness scheduler; defaults to ``HOST_RATE``/``HOST_BURST`` per
+        host, honouring ``robots.txt``.
+    frontier : CrawlFrontier, optional
+        Persistent frontier to checkpoint the crawl in.  If it still holds
+        queued URLs from an interrupted crawl, the crawl continues from
+        there.  Defaults to an in-memory frontier.
+    """
+    if scheduler is None:
+        scheduler = HostScheduler(HOST_RATE, HOST_BURST, user_agent="AperoBot", headers=HEADERS)
+    if frontier is None:
+        frontier = CrawlFrontier(":memory:")
+    loop = asyncio.get_running_loop()
+    # Number of pages currently being processed.  Idle workers wait for
+    # ``wakeup`` until new URLs are queued or all work is finished.
+    active = 0
+    wakeup = asyncio.Event()
+    # Domains without a token, and when their next token becomes available.
+    not_before: dict[str, float] = {}
+
+    def enqueue(url: str, domain: str, depth: int) -> None:
+        # The URL is fetched as found; near-duplicates are recognised by its
+        # canonical form, which may differ (e.g. in the trailing slash) and
+        # must therefore not be fetched or used to resolve relative links.
+        url = urllib.parse.urldefrag(url)[0]
+        key = canonicalize_url(url)
+        if key not in visited:
+            frontier.push(url, domain, depth, key)
+
+    async def worker() -> None:
+        nonlocal active
+        while True:
+            now = loop.time()
+            for busy in [busy for busy, ready in not_before.items() if ready <= now]:
+                del not_before[busy]
+            item = frontier.pop(not_before)
+            if item is None:
+                # Either all queued URLs belong to waiting hosts, or there is
+                # nothing to do until the active workers find new links.
+                timeout = None
+                if not_before and frontier.queued():
+                    timeout = min(not_before.values()) - now
+                elif not active:
+                    wakeup.set()
+                    return
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            active += 1
+            url, domain, depth = item
+            state: Optional[str] = "skipped"
+            record = None
+            try:
+                if url in visited:
+                    continue
+                if not await scheduler.allowed(url):
+                    print(f"Skipping {url}: disallowed by robots.txt")
+                    continue
+                delay = await scheduler.try_acquire(url)
+                if delay:
+                    # Hand the URL back instead of sleeping on its host.
+                    not_before[domain] = loop.time() + delay
+                    frontier.requeue(url)
+                    state = None
+                    continue
+                # Fetching and parsing block, so they run in a thread.
+                state, record, links = await asyncio.to_thread(fetch_and_process, url, depth < max_depth)
+                visited.add(url)
+                if record is not None:
+                    found_apero.append(record)
+                if depth < max_depth:
+                    for link in links:
+                        # Near-duplicate URLs collapse to one frontier entry.
+                        if _domain(link) == domain:
+                            enqueue(link, domain, depth + 1)
+            except asyncio.CancelledError:
+                # Leave the URL in progress so that it is queued again when
+                # the crawl is resumed.
+                state = None
+                raise
+            finally:
+                active -= 1
+                if state is not None:
+                    frontier.mark(url, state, record)
+                wakeup.set()
+
+    for start in start_urls:
+        enqueue(start, _domain(start), 0)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def crawl(url: str, visited: VisitedIndex, max_depth: int = 3) -> None:
+    """Crawl ``url`` and its subpages within the same domain.
+
+    Synchronous wrapper around :func:`crawl_async` for a single start URL.
+    """
+    asyncio.run(crawl_async([url], visited, max_depth=max_depth))
+
+def load_results(filename: Path) -> list[dict[str, str]]:
+    """Load the apero records written by a previous crawl."""
+    try:
+        with filename.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as exc:  # pragma: no cover - best effort
+        print(f"Could not load previous results from {filename}: {exc}")
+        return []
+
+def main(discover: bool = False) -> None:
+    """Entry point used when executing this module as a script.
+
+    Parameters
+    ----------
+    discover : bool, default ``False``
+        Fetch only the changed event pages found via sitemaps and listing
+        pages instead of crawling the sites, and merge their records into
+        the previous results.
+    """
+    visited = load_visited(VISITED_FILE)
+    with CrawlFrontier(FRONTIER_FILE) as frontier:
+        if frontier.pending():
+            # A previous crawl was interrupted: restore its results and
+            # continue with the URLs it had not fetched yet.
+            print(f"Resuming interrupted crawl with {frontier.pending()} pending URLs")
+            found_apero.extend(frontier.results())
+        else:
+            frontier.clear()
+            if not discover:
+                for start in URLS:
+                    print(f"Starting crawl from: {start}")
+
+        if discover:
+            # Discovery is repeated when resuming; URLs the frontier already
+            # knows are not queued again.
+            lastmod_state = load_lastmod_state(LASTMOD_FILE)
+            urls, lastmods = discover_event_urls(
+                URLS, lastmod_state, listings=LISTING_URLS, known=visited, headers=HEADERS
+            )
+            print(f"Discovered {len(urls)} new or changed event pages")
+            # Changed pages have to be fetched even though they were visited
+            # before, and their links are not followed.
+            asyncio.run(crawl_async(urls, VisitedIndex(), max_depth=0, frontier=frontier))
+        else:
+            # All start URLs share one frontier so that different sites are
+            # crawled in parallel.
+            asyncio.run(crawl_async(URLS, visited, frontier=frontier))
+
+        # Pages fetched before an interruption are only recorded in the frontier.
+        fetched = list(frontier.urls("done"))
+        visited.update(fetched)
+        save_visited(visited)
+        visited.close()
+
+        results = found_apero
+        if discover:
+            results = upsert_events(load_results(OUTPUT_FILE), found_apero)
+            for url in fetched:
+                key = canonicalize_url(url)
+                if key in lastmods:
+                    lastmod_state[key] = lastmods[key]
+            save_lastmod_state(LASTMOD_FILE, lastmod_state)
+
+        with OUTPUT_FILE.open("w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        # Records are stored per site (the host of their URL).
+        with EventStore() as store:
+            store.upsert(found_apero)
 
-    # Follow links on the page within the same domain.
-    for link in soup.find_all("a"):
-        href = link.get("href")
-        if not href:
-            continue
-        absolute = urllib.parse.urljoin(url, href)
-        parsed = urllib.parse.urlparse(absolute)
-        if parsed.netloc != domain:
-            continue
-        if any(absolute.lower().endswith(ext) for ext in [".pdf", ".jpg", ".jpeg", ".png", ".gif"]):
-            continue
-        if absolute not in visited and depth < max_depth:
-            time.sleep(1)  # be polite
-            crawl(absolute, domain, visited, depth + 1, max_depth)
-
-def main() -> None:
-    """Entry point used when executing this module as a script."""
-    for start in URLS:
-        print(f"Starting crawl from: {start}")
-        visited = load_visited(VISITED_FILE)
-        domain = urllib.parse.urlparse(start).netloc
-        crawl(start, domain, visited)
-        save_visited(VISITED_FILE, visited)
-
-    with OUTPUT_FILE.open("w", encoding="utf-8") as f:
-        json.dump(found_apero, f, indent=2, ensure_ascii=False)
+        # The crawl is complete, the next run starts from scratch.
+        frontier.clear()
 
     print(f"Apero data saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":  # pragma: no cover
-    main()
+    parser = argparse.ArgumentParser(description="Crawl websites for apero events.")
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        help="only fetch changed event pages listed in sitemaps and listing pages",
+    )
+    main(discover=parser.parse_args().discover)
@@ -1,9 +1,13 @@
 // Data sources to load event information from.
-// Each source is a JSON file (array or single object) pulled via fetch.
+// Each source is split into per-month JSON shards listed in a manifest
+// (month -> url, count, hash); only the shards of the visible months are
+// fetched. Without a manifest the full JSON file (array or single object)
+// at `path` is loaded instead.
 const sources = [
   {
     id: "amiv-apero",
     label: "AMIV Aperos",
+    manifest: "/data/amiv/manifest.json",
     path: "/data/apero_results_amiv.json",
   },
 ];
@@ -46,6 +50,12 @@ if (mobileModal) {
 const state = {
   // Flat list of all events loaded from the configured sources
   events: [],
+  // Shard manifest per source id (null for sources loaded as a whole)
+  manifests: new Map(),
+  // Pending or finished shard loads keyed by month ("YYYY-MM")
+  monthLoads: new Map(),
+  // Number of events across all months (from the manifests where available)
+  totalEvents: 0,
   // Map keyed by ISO date (YYYY-MM-DD) to an array of events occurring on that day
   eventsByDay: new Map(),
   // Currently visible calendar month/year
@@ -58,6 +68,9 @@ const state = {
 // Turn a Date into a "YYYY-MM-DD" string in UTC.
 const toISODate = (date) => date.toISOString().slice(0, 10);
 
+// Key of a month in the shard manifests ("YYYY-MM"); `month` is zero-based.
+const toMonthKey = (year, month) => `${year}-${String(month + 1).padStart(2, "0")}`;
+
 // Format an ISO date string into a friendly full date for headings.
 const formatDisplayDate = (isoString) =>
   new Date(`${isoString}T00:00:00`).toLocaleDateString(undefined, {
@@ -110,42 +123,111 @@ const normaliseEntry = (entry, sourceId) => {
   };
 };
 
-// Fetch and parse JSON from a configured source, with error surfacing.
-const fetchJson = async (source) => {
-  const response = await fetch(source.path);
+// Fetch and parse JSON from a URL, with error surfacing.
+const fetchJson = async (path) => {
+  const response = await fetch(path);
   if (!response.ok) {
-    throw new Error(`Failed to load ${source.path}: ${response.status} ${response.statusText}`);
+    throw new Error(`Failed to load ${path}: ${response.status} ${response.statusText}`);
   }
 
   return response.json();
 };
 
-// Load events from all sources, normalize them, and merge into a single list.
+// Fetch the shard manifest of a source; null if the source has none.
+const fetchManifest = async (source) => {
+  if (!source.manifest) {
+    return null;
+  }
+  const response = await fetch(source.manifest);
+  if (response.status === 404) {
+    return null;
+  }
+  if (!response.ok) {
+    throw new Error(`Failed to load ${source.manifest}: ${response.status} ${response.statusText}`);
+  }
+  return response.json();
+};
+
+// Normalize the entries of a payload and append them to the loaded events.
 // Invalid entries (e.g., without a date) are skipped with a console warning.
-const loadEventSources = async () => {
-  const items = [];
+const addEntries = (payload, sourceId) => {
+  const list = Array.isArray(payload) ? payload : [payload];
 
+  let skipped = 0;
+  list.forEach((entry) => {
+    if (!entry || !entry.date) {
+      skipped += 1;
+      return;
+    }
+    state.events.push(normaliseEntry(entry, sourceId));
+  });
+
+  if (skipped > 0) {
+    // Surface a clear hint in devtools without interrupting the UI
+    console.warn(`Skipped ${skipped} invalid entries from ${sourceId} (missing date).`);
+  }
+  return list.length - skipped;
+};
+
+// Load the manifests of all sources; sources without one are loaded completely.
+const loadEventSources = async () => {
   for (const source of sources) {
-    const payload = await fetchJson(source);
-    const list = Array.isArray(payload) ? payload : [payload];
-
-    let skipped = 0;
-    list.forEach((entry, idx) => {
-      if (!entry || !entry.date) {
-        skipped += 1;
-        return;
-      }
-      const event = normaliseEntry(entry, source.id);
-      items.push(event);
-    });
+    const manifest = await fetchManifest(source);
+    state.manifests.set(source.id, manifest);
 
-    if (skipped > 0) {
-      // Surface a clear hint in devtools without interrupting the UI
-      console.warn(`Skipped ${skipped} invalid entries from ${source.id} (missing date).`);
+    if (manifest) {
+      state.totalEvents += Object.values(manifest.months).reduce((sum, shard) => sum + shard.count, 0);
+    } else {
+      state.totalEvents += addEntries(await fetchJson(source.path), source.id);
     }
   }
+  state.eventsByDay = createEventLookup(state.events);
+};
 
-  return items;
+// Load the shards of a month (zero-based `month`) from all sharded sources.
+// Each month is requested at most once; the lookup is rebuilt afterwards.
+const loadMonth = (year, month) => {
+  const key = toMonthKey(year, month);
+  if (!state.monthLoads.has(key)) {
+    const load = (async () => {
+      const payloads = await Promise.all(
+        sources.map(async (source) => {
+          const shard = state.manifests.get(source.id)?.months?.[key];
+          if (!shard) {
+            return null;
+          }
+          // The content hash busts stale cached copies of a shard.
+          const url = new URL(shard.url, new URL(source.manifest, window.location.href));
+          url.searchParams.set("v", shard.hash);
+          return { sourceId: source.id, payload: await fetchJson(url) };
+        })
+      );
+      payloads.filter(Boolean).forEach(({ sourceId, payload }) => addEntries(payload, sourceId));
+      state.eventsByDay = createEventLookup(state.events);
+    })();
+    // Allow a failed month to be retried on the next visit.
+    load.catch(() => state.monthLoads.delete(key));
+    state.monthLoads.set(key, load);
+  }
+  return state.monthLoads.get(key);
+};
+
+// Load a month and, in the background, its neighbours whose days fill the
+// first and last week of the grid; re-render once those arrive.
+const loadVisibleMonths = async (year, month) => {
+  await loadMonth(year, month);
+
+  const neighbours = [-1, 1].map((delta) => {
+    const ref = new Date(Date.UTC(year, month + delta, 1));
+    return loadMonth(ref.getUTCFullYear(), ref.getUTCMonth());
+  });
+  Promise.all(neighbours)
+    .then(() => {
+      if (state.year === year && state.month === month) {
+        renderCalendar();
+      }
+    })
+    .catch((error) => console.error(error));
 };
 
 // Build a lookup from ISO date to a sorted list of events for that date.
@@ -218,11 +300,21 @@ const showStatus = (type, message) => {
 };
 
 // Move the visible calendar by a number of months and update the active day.
-const changeMonth = (delta) => {
+const changeMonth = async (delta) => {
   const ref = new Date(Date.UTC(state.year, state.month + delta, 1));
   state.year = ref.getUTCFullYear();
   state.month = ref.getUTCMonth();
 
+  try {
+    await loadVisibleMonths(state.year, state.month);
+  } catch (error) {
+    console.error(error);
+  }
+  if (state.year !== ref.getUTCFullYear() || state.month !== ref.getUTCMonth()) {
+    // The user navigated on while the month was loading.
+    return;
+  }
+
   const monthPrefix = `${state.year}-${String(state.month + 1).padStart(2, "0")}`;
   const monthDays = Array.from(state.eventsByDay.keys())
     .filter((d) => d.startsWith(monthPrefix))
@@ -235,7 +327,7 @@ const changeMonth = (delta) => {
 
 // Render the month grid and day cells, including navigation and highlights.
 const renderCalendar = () => {
-  const { year, month, eventsByDay, activeDay, events } = state;
+  const { year, month, eventsByDay, activeDay, totalEvents } = state;
 
   calendarContainer.innerHTML = "";
 
@@ -269,7 +361,7 @@ const renderCalendar = () => {
   controls.append(prevBtn, title, nextBtn);
 
   const meta = document.createElement("p");
-  meta.textContent = `${events.length} event${events.length === 1 ? "" : "s"} loaded`;
+  meta.textContent = `${totalEvents} event${totalEvents === 1 ? "" : "s"} loaded`;
 
   heading.append(controls, meta);
 
@@ -361,12 +453,12 @@ const renderCalendar = () => {
     const dayMonth = cur.getUTCMonth();
     const dayYear = cur.getUTCFullYear();
 
-    const gotoIfAdjacent = () => {
+    const gotoIfAdjacent = async () => {
       if (!inMonthCaptured) {
         const currentAbs = state.year * 12 + state.month;
         const targetAbs = dayYear * 12 + dayMonth;
         const delta = targetAbs - currentAbs;
-        changeMonth(delta);
+        await changeMonth(delta);
       }
       setActiveDay(iso);
     };
@@ -558,16 +650,18 @@ const setActiveDay = (isoString) => {
 const initialise = async () => {
   try {
     showStatus("loading", "Loading events…");
-    const events = await loadEventSources();
-
-    state.events = events;
-    state.eventsByDay = createEventLookup(events);
+    await loadEventSources();
+    // First paint only needs the shard of the current month.
+    await loadVisibleMonths(state.year, state.month);
 
     const todayIso = toISODate(new Date());
     const eventDays = Array.from(state.eventsByDay.keys()).sort();
     const preferredDay = eventDays.includes(todayIso)
       ? todayIso
-      : eventDays.find((iso) => iso.startsWith(`${state.year}-`)) ?? eventDays[0] ?? null;
+      : eventDays.find((iso) => iso.startsWith(`${toMonthKey(state.year, state.month)}-`)) ??
+        eventDays.find((iso) => iso.startsWith(`${state.year}-`)) ??
+        eventDays[0] ??
+        null;
 
     state.activeDay = preferredDay ?? null;
 
@@ -579,7 +673,7 @@ const initialise = async () => {
     eventPanel.innerHTML = `
       <div class="event-panel__placeholder">
         <h2>No events available</h2>
-        <p>Check that <code>data/apero_results_amiv.json</code> exists and is valid JSON.</p>
+        <p>Check that <code>data/amiv/manifest.json</code> (or <code>data/apero_results_amiv.json</code>) exists and is valid JSON.</p>
       </div>
     `;
     eventPanel.classList.add("event-panel--empty");
@@ -1,40 +1,213 @@
+import argparse
 import json
+import os
+from datetime import datetime, timedelta, timezone
 
-from backend.amiv_api import fetch_all_events, extract_event_fields
+from backend.amiv_api import (
+    changed_events,
+    iter_classified_events,
+    iter_projected_event_pages,
+    latest_update,
+    replace_window,
+    updated_since_filter,
+    upsert_events,
+)
+from backend.amiv_query import (
+    AMIV_KEYWORDS,
+    build_where,
+    combine_filters,
+    format_timestamp,
+    time_window_filter,
+)
+from backend.event_store import EventStore, store_events
+from backend.export import MonthShardWriter, write_json_array
 
-def extract_amiv():
+AMIV_API = 'https://api.amiv.ethz.ch/events/'
+
+# Server side filter for events with "apero" or "food" in one of their text
+# fields: one case-insensitive regex per field (see ``backend.amiv_query``).
+AMIV_FILTER = build_where(AMIV_KEYWORDS)
+
+AMIV_OUTPUT_FILE = "data/apero_results_amiv.json"
+
+# Source name of the AMIV events in the event store (``backend.event_store``).
+AMIV_SOURCE = "amiv"
+
+# Default "hot window" (days before/after today) of ``extract_amiv_window``.
+AMIV_WINDOW_DAYS_BEFORE = 7
+AMIV_WINDOW_DAYS_AFTER = 90
+
+# Upper bound of the open-ended window of ``extract_amiv_upcoming``.
+AMIV_FAR_FUTURE = "9999-12-31T23:59:59Z"
+
+# Per-month shards of the AMIV results and their manifest, loaded by the frontend.
+AMIV_SHARD_DIR = "data/amiv"
+
+# Remembers the highest ``_updated`` timestamp seen so far for incremental syncs.
+AMIV_SYNC_STATE_FILE = "data/amiv_sync_state.json"
+
+def load_json(filename, default):
+    """Return the JSON content of ``filename`` or ``default`` if it does not exist."""
+    try:
+        with open(filename, "r", encoding="utf-8") as infile:
+            return json.load(infile)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as exc:
+        print(f"Could not read {filename}: {exc}")
+        return default
+
+def write_amiv_results(records):
+    """
+    Stream ``records`` into apero_results_amiv.json and, at the same time,
+    into the per-month shards of the frontend (only changed months are
+    rewritten).  Returns the number of records.
+    """
+    with MonthShardWriter(AMIV_SHARD_DIR) as shards:
+        count = write_json_array(AMIV_OUTPUT_FILE, shards.passthrough(records))
+    print(f"Wrote {len(shards.manifest['months'])} monthly AMIV shards to {AMIV_SHARD_DIR} "
+          f"({len(shards.changed)} changed).")
+    return count
+
+def save_watermark(state, watermark):
+    """Store the incremental-sync ``watermark`` in the sync state file."""
+    state["updated_watermark"] = watermark
+    os.makedirs(os.path.dirname(AMIV_SYNC_STATE_FILE), exist_ok=True)
+    with open(AMIV_SYNC_STATE_FILE, "w", encoding="utf-8") as outfile:
+        json.dump(state, outfile, indent=2)
+
+def extract_amiv(incremental=False, workers=1):
     """
     Fetches events from the AMIV API, filters for 'apero' or 'food',
     and saves the results to a JSON file.
+
+    With ``incremental=True`` only events whose ``_updated`` timestamp is
+    not older than the stored watermark are requested and upserted (by event URL)
+    into the existing result file.  A full sync is done instead if no
+    watermark or no previous result file is available.  Note that events which
+    are deleted on the server, or edited so that they no longer match the
+    filter, are only dropped by a full sync.  If none of the returned events
+    differs from its stored record, no file is rewritten.
+
+    ``workers`` is the number of processes used to classify the events.
+
+    The events are also written to the event store; a full sync removes the
+    stored AMIV events it no longer returns.
     """
-    api = 'https://api.amiv.ethz.ch/events/'
+    state = load_json(AMIV_SYNC_STATE_FILE, {})
+    watermark = state.get("updated_watermark") if incremental else None
+    existing = load_json(AMIV_OUTPUT_FILE, None) if watermark else None
+    incremental = existing is not None
 
     # Fetch all events from the AMIV API and filter them for "apero".
-    events_with_apero_amiv = fetch_all_events(api, {"$or": [
-    {"title_en": {"$regex": "aper", "$options": "i"}},
-    {"description_en": {"$regex": "aper", "$options": "i"}},
-    {"catchphrase_en": {"$regex": "aper", "$options": "i"}},
-    {"title_de": {"$regex": "aper", "$options": "i"}},
-    {"description_de": {"$regex": "aper", "$options": "i"}},
-    {"catchphrase_de": {"$regex": "aper", "$options": "i"}},
-    {"title_en": {"$regex": "food", "$options": "i"}},
-    {"description_en": {"$regex": "food", "$options": "i"}},
-    {"catchphrase_en": {"$regex": "food", "$options": "i"}},
-    {"title_de": {"$regex": "essen", "$options": "i"}},
-    {"description_de": {"$regex": "essen", "$options": "i"}},
-    {"catchphrase_de": {"$regex": "essen", "$options": "i"}}
-    ]})
-
-    print(f"Found {len(events_with_apero_amiv)} events with 'apero' or 'food' in the title or description on the AMIV website.")
-
-    # Extract specific fields from each event.
-    filtered_events_amiv = [extract_event_fields(event) for event in events_with_apero_amiv]
-    
-    # Write the filtered events to a JSON file.
-    with open("data/apero_results_amiv.json", "w", encoding="utf-8") as outfile:
-        json.dump(filtered_events_amiv, outfile, ensure_ascii=False, indent=2)
-
-    print(f"Extracted information for {len(filtered_events_amiv)} AMIV events and saved to apero_results_amiv.json.")
+    # The pages are requested in parallel since a full-history sync spans many pages.
+    filter_dict = AMIV_FILTER
+    if incremental:
+        filter_dict = updated_since_filter(filter_dict, watermark)
+    # Only the fields read by ``extract_event_fields`` are requested.
+    pages = iter_projected_event_pages(AMIV_API, filter_dict, concurrent=True)
+
+    # Count the raw events and track the newest ``_updated`` timestamp while
+    # the pages stream past, without holding on to the payloads.
+    seen = {"events": 0, "watermark": watermark}
+
+    def track(pages):
+        for page in pages:
+            seen["events"] += len(page)
+            seen["watermark"] = latest_update(page, seen["watermark"])
+            yield page
+
+    # Extract specific fields from each event as soon as its page arrives.
+    filtered_events_amiv = iter_classified_events(track(pages), workers=workers)
+
+    with EventStore() as store:
+        if incremental:
+            # The delta is small, so it is collected and merged into the stored results.
+            updates = changed_events(existing, filtered_events_amiv)
+            print(f"Found {seen['events']} AMIV events updated since {watermark}.")
+            if not updates:
+                print("No changes on the AMIV website, keeping apero_results_amiv.json as is.")
+                save_watermark(state, seen["watermark"])
+                return
+            store.upsert(updates, AMIV_SOURCE)
+            count = write_amiv_results(upsert_events(existing, updates))
+        else:
+            # Stream the results to disk (and into the store) so memory use
+            # does not grow with the archive.
+            urls = set()
+
+            def remember(records):
+                for record in records:
+                    urls.add(record["url"])
+                    yield record
+
+            records = store_events(store, remember(filtered_events_amiv), AMIV_SOURCE)
+            count = write_amiv_results(records)
+            store.prune(AMIV_SOURCE, urls)
+            print(f"Found {seen['events']} events with 'apero' or 'food' in the title or description on the AMIV website.")
+
+    # Persist the new watermark only after the results have been written so
+    # that an aborted run is simply repeated next time.
+    save_watermark(state, seen["watermark"])
+
+    print(f"Extracted information for {count} AMIV events and saved to apero_results_amiv.json.")
+
+def sync_amiv_window(start, end=None, workers=1):
+    """
+    Refreshes only the AMIV events with ``start <= time_start < end``.
+
+    The requested events replace the events of that window in the existing
+    result file; events outside the window are kept as they are.  Without
+    ``end`` the window is open-ended.  Without a previous result file a
+    full sync is done instead.
+
+    The incremental-sync watermark is left untouched since the window does
+    not cover all updated events.
+    """
+    existing = load_json(AMIV_OUTPUT_FILE, None)
+    if existing is None:
+        print("No previous AMIV results, running a full sync instead.")
+        extract_amiv(workers=workers)
+        return
+
+    filter_dict = combine_filters(AMIV_FILTER, time_window_filter(start, end))
+    pages = iter_projected_event_pages(AMIV_API, filter_dict, concurrent=True)
+    updates = list(iter_classified_events(pages, workers=workers))
+
+    merged = replace_window(existing, updates, start, end or AMIV_FAR_FUTURE)
+    count = write_amiv_results(merged)
+    with EventStore() as store:
+        store.upsert(updates, AMIV_SOURCE)
+        store.prune(AMIV_SOURCE, (record["url"] for record in updates), start, end)
+    print(f"Refreshed {len(updates)} AMIV events starting between {start} and {end or 'any time later'}; "
+          f"{count} events saved to apero_results_amiv.json.")
+
+def extract_amiv_window(days_before=AMIV_WINDOW_DAYS_BEFORE, days_after=AMIV_WINDOW_DAYS_AFTER, workers=1):
+    """
+    Refreshes only the AMIV events starting within a window around today.
+
+    The calendar mostly shows the current and the next month, so this sync
+    is meant to run often, while the full sync (``extract_amiv``) that also
+    covers the archive runs rarely.  Events with ``time_start`` between
+    ``days_before`` days before and ``days_after`` days after the start of
+    today (UTC) are merged into the existing results, see ``sync_amiv_window``.
+    """
+    # Day bounds keep the request URL, and thus its cache entry, stable
+    # across the runs of a day.
+    now = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = format_timestamp(now - timedelta(days=days_before))
+    end = format_timestamp(now + timedelta(days=days_after))
+    sync_amiv_window(start, end, workers=workers)
+
+def extract_amiv_upcoming(workers=1):
+    """
+    Refreshes only the AMIV events starting today (UTC) or later.
+
+    They are merged into the existing results like the hot window of
+    ``extract_amiv_window``, so past events and their shards are kept.
+    """
+    now = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    sync_amiv_window(format_timestamp(now), workers=workers)
 
 def main():
 
@@ -42,7 +215,49 @@ def main():
     Main function to execute the extraction of all events from all possible sites.
     This function is called when the script is run directly.
     """
-    extract_amiv()
+    parser = argparse.ArgumentParser(description="Extract apero events from all supported sites.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only fetch AMIV events updated since the last run",
+    )
+    mode.add_argument(
+        "--upcoming",
+        action="store_true",
+        help="only refresh AMIV events starting today or later",
+    )
+    mode.add_argument(
+        "--window",
+        action="store_true",
+        help="only refresh AMIV events starting within the hot window around today",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to classify the events (default: 1)",
+    )
+    parser.add_argument(
+        "--days-before",
+        type=int,
+        default=AMIV_WINDOW_DAYS_BEFORE,
+        help=f"start of the hot window in days before today (default: {AMIV_WINDOW_DAYS_BEFORE})",
+    )
+    parser.add_argument(
+        "--days-after",
+        type=int,
+        default=AMIV_WINDOW_DAYS_AFTER,
+        help=f"end of the hot window in days after today (default: {AMIV_WINDOW_DAYS_AFTER})",
+    )
+    args = parser.parse_args()
+
+    if args.window:
+        extract_amiv_window(args.days_before, args.days_after, workers=args.workers)
+    elif args.upcoming:
+        extract_amiv_upcoming(workers=args.workers)
+    else:
+        extract_amiv(incremental=args.incremental, workers=args.workers)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()